@@ -1,12 +1,22 @@
 """Define module-level imports."""
 # pylint: disable=C0103
+from .adaptive import AdaptiveUpdateRate  # noqa
 from .const import PowerLevel  # noqa
 from .const import PyOnMessageTypes  # noqa
+from .discovery import DiscoveredClient, create_fleet, discover_async  # noqa
 from .exceptions import (  # noqa
     FoldingAtHomeControlAuthenticationFailed,
     FoldingAtHomeControlAuthenticationRequired,
     FoldingAtHomeControlConnectionFailed,
     FoldingAtHomeControlException,
     FoldingAtHomeControlNotConnected,
+    FoldingAtHomeControlReadTimeout,
 )
+from .export import ExportFormat, ExportSink, FsyncPolicy  # noqa
+from .fleet import FleetCommandResult, FoldingAtHomeFleet  # noqa
 from .foldingathomecontrol import FoldingAtHomeController  # noqa
+from .forecast import FleetForecast, Forecast  # noqa
+from .proxy import FoldingAtHomeProxy  # noqa
+from .runner import BackgroundRunner  # noqa
+from .snapshot import load_snapshot, persist_snapshots_async, save_snapshot  # noqa
+from .unitindex import IndexedUnit, UnitIndex  # noqa
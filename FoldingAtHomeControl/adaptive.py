@@ -0,0 +1,149 @@
+"""Adapt subscription update rates to how often the data changes."""
+import logging
+import math
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .const import SUBSCRIPTION_MESSAGE_TYPES, PyOnMessageTypes
+from .exceptions import FoldingAtHomeControlException
+from .foldingathomecontrol import FoldingAtHomeController
+from .forecast import parse_interval, parse_number
+
+_LOGGER = logging.getLogger(__name__)
+
+MIN_UPDATE_RATE_IN_SECONDS = 5
+MAX_UPDATE_RATE_IN_SECONDS = 300
+BACKOFF_FACTOR = 2
+NEAR_COMPLETION_PERCENT = 95.0
+ADAPTED_MESSAGE_TYPES = (
+    PyOnMessageTypes.OPTIONS.value,
+    PyOnMessageTypes.UNITS.value,
+    PyOnMessageTypes.SLOTS.value,
+)
+
+SubscriptionKey = Tuple[str, str]
+
+
+def get_signature(message_type: str, message: Any) -> Any:
+    """Return the part of a message whose changes matter.
+
+    Unit progress changes with every update, so units only count as changed
+    when one appears, disappears or changes its state. Slots are compared by
+    status, all other messages as a whole.
+    """
+    if message_type == PyOnMessageTypes.UNITS.value:
+        return tuple(
+            (unit.get("id"), unit.get("unit"), unit.get("state")) for unit in message
+        )
+    if message_type == PyOnMessageTypes.SLOTS.value:
+        return tuple((slot.get("id"), slot.get("status")) for slot in message)
+    return message
+
+
+def is_near_completion(message_type: str, message: Any) -> bool:
+    """Whether a units message contains a running unit about to finish.
+
+    Paused, uploading or otherwise stuck units keep their progress, so only
+    running units count, otherwise a stalled unit would pin the rate.
+    """
+    if message_type != PyOnMessageTypes.UNITS.value:
+        return False
+    return any(
+        str(unit.get("state", "")).upper() == "RUNNING"
+        and parse_number(unit.get("percentdone")) >= NEAR_COMPLETION_PERCENT
+        for unit in message
+    )
+
+
+def get_shortest_eta(message_type: str, message: Any) -> Optional[float]:
+    """Return the seconds until the first running unit finishes, if known."""
+    if message_type != PyOnMessageTypes.UNITS.value:
+        return None
+    etas = [
+        parse_interval(unit.get("eta"))
+        for unit in message
+        if str(unit.get("state", "")).upper() == "RUNNING"
+    ]
+    etas = [eta for eta in etas if not math.isnan(eta)]
+    return min(etas) if etas else None
+
+
+class AdaptiveUpdateRate:
+    """Adjust the subscription rate of each host and message type.
+
+    The rate of a subscription is multiplied by backoff_factor every time its
+    data arrives unchanged and drops to min_rate as soon as it changes or a
+    unit is about to finish. While units are running, their rate stays below
+    half the shortest eta, so an update arrives before the unit finishes.
+    Subscriptions are re-registered under their id, so no other subscription
+    of the host is cleared.
+    """
+
+    def __init__(
+        self,
+        min_rate: int = MIN_UPDATE_RATE_IN_SECONDS,
+        max_rate: int = MAX_UPDATE_RATE_IN_SECONDS,
+        backoff_factor: int = BACKOFF_FACTOR,
+        message_types: Iterable[str] = ADAPTED_MESSAGE_TYPES,
+    ) -> None:
+        """Initialize the rate bounds."""
+        self._min_rate: int = min_rate
+        self._max_rate: int = max_rate
+        self._backoff_factor: int = backoff_factor
+        self._commands: Dict[str, str] = {
+            message_type: command
+            for command, message_type in SUBSCRIPTION_MESSAGE_TYPES.items()
+            if message_type in set(message_types)
+        }
+        self._signatures: Dict[SubscriptionKey, Any] = {}
+        self._rates: Dict[SubscriptionKey, int] = {}
+
+    def attach(self, name: str, controller: FoldingAtHomeController) -> Callable:
+        """Adapt the subscription rates of a controller."""
+
+        async def callback(message_type: str, message: Any) -> None:
+            """Adapt the rate of the subscription the message belongs to."""
+            command = self._commands.get(message_type)
+            if command is None:
+                return
+            update_rate = self.observe(name, message_type, message)
+            if controller.subscriptions.get(command) in (None, update_rate):
+                return
+            try:
+                await controller.set_command_update_rate_async(command, update_rate)
+            except FoldingAtHomeControlException as error:
+                _LOGGER.debug("Could not change update rate of %s: %r", name, error)
+
+        remove_callback = controller.register_callback(callback)
+
+        def detach() -> None:
+            """Stop adapting and forget the state of the controller."""
+            remove_callback()
+            for message_type in self._commands:
+                self._signatures.pop((name, message_type), None)
+                self._rates.pop((name, message_type), None)
+
+        return detach
+
+    def observe(self, name: str, message_type: str, message: Any) -> int:
+        """Record a message and return the update rate it calls for."""
+        key = (name, message_type)
+        signature = get_signature(message_type, message)
+        previous_signature = self._signatures.get(key)
+        self._signatures[key] = signature
+        if (
+            key not in self._rates
+            or signature != previous_signature
+            or is_near_completion(message_type, message)
+        ):
+            update_rate = self._min_rate
+        else:
+            update_rate = min(self._rates[key] * self._backoff_factor, self._max_rate)
+        eta = get_shortest_eta(message_type, message)
+        if eta is not None:
+            update_rate = min(update_rate, max(int(eta / 2), self._min_rate))
+        self._rates[key] = update_rate
+        return update_rate
+
+    def get_update_rate(self, name: str, message_type: str) -> Optional[int]:
+        """Return the current update rate of a host and message type."""
+        return self._rates.get((name, message_type))
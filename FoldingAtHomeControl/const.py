@@ -7,10 +7,13 @@ COMMAND_POWER = "option power"
 COMMAND_HEARTBEAT = "heartbeat"
 COMMAND_QUEUE_INFO = "queue-info"
 COMMAND_SLOT_INFO = "slot-info"
+COMMAND_SLOT_OPTIONS = "slot-options"
 COMMAND_REQUEST_WORKSERVER_ASSIGNMENT = "request-ws"
 COMMAND_PAUSE = "pause"
 COMMAND_UNPAUSE = "unpause"
 COMMAND_SHUTDOWN = "shutdown"
+COMMAND_TRAJECTORY = "trajectory"
+COMMAND_SIMULATION_INFO = "simulation-info"
 
 SUBSCRIBE_COMMANDS = [
     COMMAND_HEARTBEAT,
@@ -24,6 +27,14 @@ PY_ON_MESSAGE_HEADER = "PyON 1"
 PY_ON_MESSAGE_FOOTER = "---"
 PY_ON_ERROR = "ERROR"
 UNAUTHENTICATED_INDICATOR = "unknown command or variable 'updates'"
+SLOT_STATUS_PAUSED = "PAUSED"
+
+# Byte versions matched against the undecoded socket data
+PY_ON_MESSAGE_HEADER_BYTES = PY_ON_MESSAGE_HEADER.encode()
+PY_ON_MESSAGE_FOOTER_BYTES = f"\n{PY_ON_MESSAGE_FOOTER}\n".encode()
+PY_ON_ERROR_BYTES = PY_ON_ERROR.encode()
+UNAUTHENTICATED_INDICATOR_BYTES = UNAUTHENTICATED_INDICATOR.encode()
+WELCOME_INDICATOR_BYTES = b"Folding@home Client"
 
 
 class PyOnMessageTypes(Enum):
@@ -32,7 +43,11 @@ class PyOnMessageTypes(Enum):
     UNITS = "units"
     OPTIONS = "options"
     SLOTS = "slots"
+    SLOT_OPTIONS = "slot-options"
+    TRAJECTORY = "trajectory"
+    SIMULATION_INFO = "simulation-info"
     ERROR = "error"
+    HEARTBEAT = "heartbeat"
 
 
 class PowerLevel(Enum):
@@ -41,3 +56,11 @@ class PowerLevel(Enum):
     LIGHT = "Light"
     MEDIUM = "Medium"
     FULL = "Full"
+
+
+SUBSCRIPTION_MESSAGE_TYPES = {
+    COMMAND_HEARTBEAT: PyOnMessageTypes.HEARTBEAT.value,
+    COMMAND_OPTIONS: PyOnMessageTypes.OPTIONS.value,
+    COMMAND_QUEUE_INFO: PyOnMessageTypes.UNITS.value,
+    COMMAND_SLOT_INFO: PyOnMessageTypes.SLOTS.value,
+}
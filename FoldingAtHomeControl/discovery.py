@@ -0,0 +1,190 @@
+"""Discover Folding@Home Clients on the network."""
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Iterator, List, Optional
+
+from .const import (
+    COMMAND_HEARTBEAT,
+    PY_ON_MESSAGE_HEADER_BYTES,
+    UNAUTHENTICATED_INDICATOR_BYTES,
+    WELCOME_INDICATOR_BYTES,
+)
+from .exceptions import FoldingAtHomeControlException
+from .fleet import FoldingAtHomeFleet
+from .foldingathomecontrol import FoldingAtHomeController
+from .serialconnection import SerialConnection
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 1024
+CONNECT_TIMEOUT_IN_SECONDS = 0.5
+AUTHENTICATION_PROBE = f"updates list\n{COMMAND_HEARTBEAT}\n"
+MAX_AUTHENTICATION_PROBE_MESSAGE_COUNT = 10
+
+PROBE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncio.IncompleteReadError,
+    asyncio.LimitOverrunError,
+    FoldingAtHomeControlException,
+)
+
+
+@dataclass
+class DiscoveredClient:
+    """A Folding@Home Client found on the network."""
+
+    address: str
+    port: int
+    authentication_required: Optional[bool] = None
+
+    def create_controller(self, **kwargs: Any) -> FoldingAtHomeController:
+        """Create a controller for this client."""
+        return FoldingAtHomeController(self.address, self.port, **kwargs)
+
+
+def create_fleet(
+    clients: Iterable[DiscoveredClient], **kwargs: Any
+) -> FoldingAtHomeFleet:
+    """Create a fleet containing a controller for each discovered client."""
+    fleet = FoldingAtHomeFleet()
+    for client in clients:
+        fleet.add_controller(
+            f"{client.address}:{client.port}", client.create_controller(**kwargs)
+        )
+    return fleet
+
+
+async def probe_async(
+    address: str,
+    port: int = 36330,
+    timeout: float = CONNECT_TIMEOUT_IN_SECONDS,
+    check_authentication: bool = False,
+) -> Optional[DiscoveredClient]:
+    """Return the client listening on address and port or None."""
+    connection = SerialConnection(address, port, read_timeout=timeout)
+    try:
+        await asyncio.wait_for(connection.connect_async(), timeout)
+        if WELCOME_INDICATOR_BYTES not in connection.welcome_message:
+            return None
+        client = DiscoveredClient(address, port)
+        if check_authentication:
+            client.authentication_required = await _probe_authentication_async(
+                connection, timeout
+            )
+        return client
+    except PROBE_ERRORS:
+        return None
+    finally:
+        await _close_async(connection, timeout)
+
+
+async def _probe_authentication_async(
+    connection: SerialConnection, timeout: float
+) -> Optional[bool]:
+    """Check whether the client answers subscription commands without auth."""
+    await connection.send_async(AUTHENTICATION_PROBE)
+    for _ in range(MAX_AUTHENTICATION_PROBE_MESSAGE_COUNT):
+        try:
+            line = await connection.read_line_async(timeout)
+        except PROBE_ERRORS:
+            return None
+        if UNAUTHENTICATED_INDICATOR_BYTES in line:
+            return True
+        if PY_ON_MESSAGE_HEADER_BYTES in line:
+            return False
+    return None
+
+
+async def _close_async(connection: SerialConnection, timeout: float) -> None:
+    """Close a probe connection without waiting longer than timeout."""
+    try:
+        await asyncio.wait_for(connection.cleanup_async(), timeout)
+    except PROBE_ERRORS:
+        pass
+
+
+def iterate_addresses(networks: Iterable[str]) -> Iterator[str]:
+    """Yield the host addresses of the given CIDR ranges or addresses."""
+    for network in networks:
+        parsed_network = ipaddress.ip_network(network, strict=False)
+        # Single addresses and point-to-point links have no reserved addresses
+        if parsed_network.num_addresses <= 2:
+            hosts: Iterable[Any] = parsed_network
+        else:
+            hosts = parsed_network.hosts()
+        for host in hosts:
+            yield str(host)
+
+
+async def discover_async(
+    networks: Iterable[str],
+    port: int = 36330,
+    max_concurrency: int = MAX_CONCURRENCY,
+    timeout: float = CONNECT_TIMEOUT_IN_SECONDS,
+    check_authentication: bool = False,
+) -> List[DiscoveredClient]:
+    """Scan the given networks for Folding@Home Clients.
+
+    A fixed number of workers pull addresses from a shared iterator, so even
+    large ranges only ever have max_concurrency connections in flight.
+    """
+    addresses = iterate_addresses(networks)
+    clients: List[DiscoveredClient] = []
+
+    async def worker() -> None:
+        """Probe addresses until none are left."""
+        for address in addresses:
+            client = await probe_async(address, port, timeout, check_authentication)
+            if client is not None:
+                _LOGGER.debug("Discovered client at %s:%d", address, port)
+                clients.append(client)
+
+    await asyncio.gather(*(worker() for _ in range(max_concurrency)))
+    return sorted(clients, key=lambda client: ipaddress.ip_address(client.address))
+
+
+def raise_open_file_limit(max_concurrency: int) -> None:
+    """Raise the open file limit so every concurrent probe gets a socket."""
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:  # pragma: no cover
+        return
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    required_limit = max_concurrency + 64
+    if soft_limit != resource.RLIM_INFINITY and soft_limit < required_limit:
+        if hard_limit != resource.RLIM_INFINITY:
+            required_limit = min(required_limit, hard_limit)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (required_limit, hard_limit))
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    """Discover clients and print them as JSON."""
+    parser = argparse.ArgumentParser(
+        description="Discover Folding@Home Clients on the network."
+    )
+    parser.add_argument("networks", nargs="+", help="CIDR ranges or addresses")
+    parser.add_argument("--port", type=int, default=36330)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=CONNECT_TIMEOUT_IN_SECONDS)
+    parser.add_argument(
+        "--check-auth",
+        action="store_true",
+        help="check whether the clients require a password",
+    )
+    args = parser.parse_args(arguments)
+    raise_open_file_limit(args.concurrency)
+    clients = asyncio.run(
+        discover_async(
+            args.networks, args.port, args.concurrency, args.timeout, args.check_auth
+        )
+    )
+    print(json.dumps([asdict(client) for client in clients], indent=4))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -29,3 +29,9 @@ class FoldingAtHomeControlNotConnected(FoldingAtHomeControlException):
     """Socket is not connected."""
 
     pass
+
+
+class FoldingAtHomeControlReadTimeout(FoldingAtHomeControlConnectionFailed):
+    """Nothing was received within the read timeout."""
+
+    pass
@@ -0,0 +1,211 @@
+"""Export controller messages to files in batches."""
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+from .foldingathomecontrol import FoldingAtHomeController
+
+_LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+FLUSH_INTERVAL_IN_SECONDS = 5.0
+MAX_FILE_SIZE_IN_BYTES = 2**26
+BACKUP_COUNT = 5
+CSV_FIELDS = ("host", "type", "received_at", "message")
+
+
+class ExportFormat(Enum):
+    """File formats of the export sink."""
+
+    JSONL = "jsonl"
+    CSV = "csv"
+
+
+class FsyncPolicy(Enum):
+    """When the export sink forces written data to disk."""
+
+    NEVER = "never"
+    ROTATE = "rotate"
+    BATCH = "batch"
+
+
+class ExportSink:
+    """Buffer controller messages and write them to rotating files.
+
+    Callbacks only append a record to an in-memory buffer. A background thread
+    writes the buffer to disk once batch_size records are pending or
+    flush_interval seconds have passed, so file I/O never blocks the event
+    loop. When the file grows beyond max_file_size it is renamed to path.1,
+    older files are shifted up to path.<backup_count>.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        export_format: ExportFormat = ExportFormat.JSONL,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_IN_SECONDS,
+        fsync_policy: FsyncPolicy = FsyncPolicy.NEVER,
+        max_file_size: int = MAX_FILE_SIZE_IN_BYTES,
+        backup_count: int = BACKUP_COUNT,
+    ) -> None:
+        """Initialize the sink."""
+        self._path: str = path
+        self._export_format: ExportFormat = export_format
+        self._batch_size: int = batch_size
+        self._flush_interval: float = flush_interval
+        self._fsync_policy: FsyncPolicy = fsync_policy
+        self._max_file_size: int = max_file_size
+        self._backup_count: int = backup_count
+
+        self._records: List[Dict[str, Any]] = []
+        self._condition = threading.Condition()
+        self._closing: bool = False
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[io.TextIOWrapper] = None
+
+    def attach(
+        self,
+        name: str,
+        controller: FoldingAtHomeController,
+        message_types: Optional[Collection[str]] = None,
+    ) -> Callable:
+        """Export the messages of a controller, optionally only some types."""
+
+        def callback(message_type: str, message: Any) -> None:
+            """Add a message to the export buffer."""
+            if message_types is None or message_type in message_types:
+                self.add_record(name, message_type, message)
+
+        return controller.register_callback(callback)
+
+    def add_record(self, host: str, message_type: str, message: Any) -> None:
+        """Buffer a message for the next batch."""
+        record = {
+            "host": host,
+            "type": message_type,
+            "received_at": time.time(),
+            "message": message,
+        }
+        with self._condition:
+            self._records.append(record)
+            if len(self._records) >= self._batch_size:
+                self._condition.notify()
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        self._closing = False
+        self._thread = threading.Thread(
+            target=self._run, name="FoldingAtHomeExport", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Write all pending records and stop the background thread."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Write batches until the sink is closed."""
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._closing or len(self._records) >= self._batch_size,
+                        self._flush_interval,
+                    )
+                    records, self._records = self._records, []
+                    closing = self._closing
+                if records:
+                    self._write_batch(records)
+                if closing:
+                    break
+        finally:
+            self._close_file(self._fsync_policy != FsyncPolicy.NEVER)
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        """Write a batch of records, logging but surviving I/O errors."""
+        try:
+            file = self._open_file()
+            file.write(self._encode(records))
+            file.flush()
+            if self._fsync_policy == FsyncPolicy.BATCH:
+                os.fsync(file.fileno())
+            if file.tell() >= self._max_file_size:
+                self._rotate()
+        except OSError as error:
+            _LOGGER.error(
+                "Could not export %d records to %s: %s",
+                len(records),
+                self._path,
+                error,
+            )
+
+    def _encode(self, records: List[Dict[str, Any]]) -> str:
+        """Encode a batch of records in the export format."""
+        if self._export_format == ExportFormat.JSONL:
+            return "".join(
+                json.dumps(record, separators=(",", ":")) + "\n" for record in records
+            )
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        for record in records:
+            writer.writerow(
+                [
+                    record["host"],
+                    record["type"],
+                    record["received_at"],
+                    json.dumps(record["message"], separators=(",", ":")),
+                ]
+            )
+        return output.getvalue()
+
+    def _open_file(self) -> io.TextIOWrapper:
+        """Return the current export file, creating it if necessary."""
+        if self._file is None:
+            self._file = open(  # pylint: disable=consider-using-with
+                self._path, "a", encoding="utf-8", newline=""
+            )
+            if self._export_format == ExportFormat.CSV and self._file.tell() == 0:
+                self._file.write(",".join(CSV_FIELDS) + "\n")
+        return self._file
+
+    def _rotate(self) -> None:
+        """Move the current file to the first backup and shift older ones."""
+        self._close_file(self._fsync_policy != FsyncPolicy.NEVER)
+        if self._backup_count <= 0:
+            os.remove(self._path)
+            return
+        for index in range(self._backup_count - 1, 0, -1):
+            source = f"{self._path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self._path}.{index + 1}")
+        os.replace(self._path, f"{self._path}.1")
+
+    def _close_file(self, fsync: bool = False) -> None:
+        """Close the current export file."""
+        if self._file is None:
+            return
+        try:
+            if fsync:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+            self._file = None
+
+    @property
+    def pending_count(self) -> int:
+        """The number of buffered records not yet written."""
+        with self._condition:
+            return len(self._records)
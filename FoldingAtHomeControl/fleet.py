@@ -0,0 +1,483 @@
+"""Control many Folding@Home Clients at once."""
+import asyncio
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .const import (
+    COMMAND_OPTIONS,
+    COMMAND_PAUSE,
+    COMMAND_POWER,
+    COMMAND_SLOT_INFO,
+    COMMAND_SLOT_OPTIONS,
+    COMMAND_UNPAUSE,
+    SLOT_STATUS_PAUSED,
+    PowerLevel,
+    PyOnMessageTypes,
+)
+from .exceptions import FoldingAtHomeControlException
+from .foldingathomecontrol import FoldingAtHomeController
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 100
+ACKNOWLEDGEMENT_TIMEOUT_IN_SECONDS = 10
+SHUTDOWN_TIMEOUT_IN_SECONDS = 5
+# Options the client accepts in any case and reports in its own, e.g. "FULL"
+CASE_INSENSITIVE_OPTIONS = frozenset({"power", "cause", "client-type", "core-priority"})
+
+Condition = Callable[[Any], bool]
+# The commands and the acknowledgement conditions by message type
+Preparation = Tuple[List[str], Dict[str, Condition]]
+
+
+@dataclass
+class FleetCommandResult:
+    """Outcome of a fleet command on a single client."""
+
+    name: str
+    acknowledged: bool
+    error: Optional[BaseException] = None
+
+
+def format_option_value(value: Any) -> str:
+    """Format an option value the way the client reports it."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+
+def is_option_value_equal(name: str, current: Any, desired: Any) -> bool:
+    """Whether two values of an option are the same to the client."""
+    current_value = format_option_value(current)
+    desired_value = format_option_value(desired)
+    if name in CASE_INSENSITIVE_OPTIONS:
+        return current_value.lower() == desired_value.lower()
+    return current_value == desired_value
+
+
+def get_option_drift(
+    current: Optional[Mapping[str, Any]], desired: Mapping[str, Any]
+) -> Dict[str, str]:
+    """Return the desired options which differ from the current ones."""
+    return {
+        name: format_option_value(value)
+        for name, value in desired.items()
+        if current is None
+        or name not in current
+        or not is_option_value_equal(name, current[name], value)
+    }
+
+
+def format_options_command(
+    options: Mapping[str, str], command: str = COMMAND_OPTIONS
+) -> str:
+    """Build a single command setting all options, by default globally."""
+    assignments = []
+    for name, value in options.items():
+        if not value or any(character in value for character in ' \t"'):
+            value = '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        assignments.append(f"{name}={value}")
+    return " ".join([command] + assignments)
+
+
+async def query_options_async(
+    controller: FoldingAtHomeController, names: Iterable[str]
+) -> Dict[str, Any]:
+    """Query options by name including those at their default value.
+
+    The reply is merged into the latest options of the controller, which the
+    next options message is taken from. Options the client does not know or
+    which are unset are missing from the result.
+    """
+    names = list(names)
+    reply = controller.expect_message(PyOnMessageTypes.OPTIONS.value, lambda _: True)
+    try:
+        await controller.send_command_async(f"{COMMAND_OPTIONS} -d {' '.join(names)}")
+        options = await reply
+    finally:
+        reply.cancel()
+    return {name: options[name] for name in names if name in options}
+
+
+def collect_slot_replies(
+    slot_ids: List[str], replies: Dict[str, Dict[str, Any]]
+) -> Condition:
+    """Return a condition collecting slot-options replies until all slots replied.
+
+    Replies are matched to their slot by id or, if the client omits it, by the
+    order of slot_ids, which is the order the commands were sent in.
+    """
+    count = 0
+
+    def condition(reply: Any) -> bool:
+        """Store the reply and check whether every slot has replied."""
+        nonlocal count
+        if not isinstance(reply, dict) or count >= len(slot_ids):
+            return False
+        slot_id = str(reply.get("id", slot_ids[count]))
+        count += 1
+        replies[slot_id] = {
+            name: value for name, value in reply.items() if name != "id"
+        }
+        return all(expected in replies for expected in slot_ids)
+
+    return condition
+
+
+async def query_slot_options_async(
+    controller: FoldingAtHomeController, slot_ids: List[str], names: Iterable[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Query options of many slots by name, including defaulted ones.
+
+    All slots are queried in a single write, the result maps slot ids to
+    their options.
+    """
+    arguments = " ".join(["-d"] + list(names))
+    replies: Dict[str, Dict[str, Any]] = {}
+    reply = controller.expect_message(
+        PyOnMessageTypes.SLOT_OPTIONS.value, collect_slot_replies(slot_ids, replies)
+    )
+    try:
+        await controller.send_command_async(
+            "\n".join(
+                f"{COMMAND_SLOT_OPTIONS} {slot_id} {arguments}" for slot_id in slot_ids
+            )
+        )
+        await reply
+    finally:
+        reply.cancel()
+    return replies
+
+
+async def prepare_slot_options_async(
+    controller: FoldingAtHomeController,
+    desired: Mapping[str, Any],
+    slot_filter: Optional[Callable[[dict], bool]],
+) -> Tuple[List[str], Optional[Condition]]:
+    """Build the slot-options commands for the drift of the matching slots.
+
+    Returns no commands and no condition if all slots are in sync.
+    """
+    slots = controller.get_latest_message(PyOnMessageTypes.SLOTS.value)
+    if slots is None:
+        raise FoldingAtHomeControlException(
+            "No slot information has been received yet."
+        )
+    slot_ids = [
+        slot["id"] for slot in slots if slot_filter is None or slot_filter(slot)
+    ]
+    if not slot_ids:
+        return [], None
+    current = await query_slot_options_async(controller, slot_ids, desired)
+    drifts = {
+        slot_id: get_option_drift(current.get(slot_id), desired) for slot_id in slot_ids
+    }
+    drifts = {slot_id: drift for slot_id, drift in drifts.items() if drift}
+    if not drifts:
+        return [], None
+    commands = [
+        format_options_command(drift, f"{COMMAND_SLOT_OPTIONS} {slot_id}")
+        for slot_id, drift in drifts.items()
+    ]
+    replies: Dict[str, Dict[str, Any]] = {}
+    collect = collect_slot_replies(list(drifts), replies)
+
+    def condition(reply: Any) -> bool:
+        """Check whether every slot lists its desired values."""
+        return collect(reply) and not any(
+            get_option_drift(replies[slot_id], drift)
+            for slot_id, drift in drifts.items()
+        )
+
+    return commands, condition
+
+
+class FoldingAtHomeFleet:
+    """Manage a fleet of named FoldingAtHomeControllers."""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY) -> None:
+        """Initialize an empty fleet."""
+        self._controllers: Dict[str, FoldingAtHomeController] = {}
+        self._groups: Dict[str, Set[str]] = {}
+        self._max_concurrency: int = max_concurrency
+
+    def add_controller(
+        self,
+        name: str,
+        controller: FoldingAtHomeController,
+        groups: Iterable[str] = (),
+    ) -> None:
+        """Add a controller to the fleet and optionally to host groups."""
+        self._controllers[name] = controller
+        for group in groups:
+            self._groups.setdefault(group, set()).add(name)
+
+    def remove_controller(self, name: str) -> FoldingAtHomeController:
+        """Remove a controller from the fleet and return it."""
+        for members in self._groups.values():
+            members.discard(name)
+        return self._controllers.pop(name)
+
+    def select(self, group: Optional[str] = None) -> Dict[str, FoldingAtHomeController]:
+        """Return the controllers of a group or of the whole fleet."""
+        if group is None:
+            return dict(self._controllers)
+        return {
+            name: self._controllers[name]
+            for name in sorted(self._groups.get(group, ()))
+            if name in self._controllers
+        }
+
+    async def start(self) -> Dict[str, Exception]:
+        """Connect and listen to all controllers of the fleet.
+
+        A controller which fails does not stop the others. Returns the errors
+        of the controllers which stopped with an exception by name.
+        """
+        controllers = dict(self._controllers)
+        results = await asyncio.gather(
+            *(controller.start() for controller in controllers.values()),
+            return_exceptions=True,
+        )
+        errors = {}
+        for index, name in enumerate(controllers):
+            result = results[index]
+            if isinstance(result, Exception):
+                _LOGGER.error("Controller %s stopped: %r", name, result)
+                errors[name] = result
+        return errors
+
+    async def close_async(
+        self, timeout: float = SHUTDOWN_TIMEOUT_IN_SECONDS
+    ) -> Dict[str, bool]:
+        """Close all connections concurrently within one overall deadline.
+
+        Connections which do not close in time are aborted. Returns whether
+        each controller was closed cleanly.
+        """
+        names = list(self._controllers)
+        results = await asyncio.gather(
+            *(self._controllers[name].close_async(timeout) for name in names),
+            return_exceptions=True,
+        )
+        return {name: results[index] is True for index, name in enumerate(names)}
+
+    async def pause_slots_async(
+        self,
+        group: Optional[str] = None,
+        slot_filter: Optional[Callable[[dict], bool]] = None,
+        timeout: float = ACKNOWLEDGEMENT_TIMEOUT_IN_SECONDS,
+    ) -> Dict[str, FleetCommandResult]:
+        """Pause the slots matching slot_filter and wait until they are paused."""
+        return await self._set_slots_paused_async(True, group, slot_filter, timeout)
+
+    async def unpause_slots_async(
+        self,
+        group: Optional[str] = None,
+        slot_filter: Optional[Callable[[dict], bool]] = None,
+        timeout: float = ACKNOWLEDGEMENT_TIMEOUT_IN_SECONDS,
+    ) -> Dict[str, FleetCommandResult]:
+        """Unpause the slots matching slot_filter and wait until they are unpaused."""
+        return await self._set_slots_paused_async(False, group, slot_filter, timeout)
+
+    async def set_power_level_async(
+        self,
+        power_level: PowerLevel,
+        group: Optional[str] = None,
+        timeout: float = ACKNOWLEDGEMENT_TIMEOUT_IN_SECONDS,
+    ) -> Dict[str, FleetCommandResult]:
+        """Set the power level and wait until the options reflect it."""
+
+        def condition(options: Any) -> bool:
+            """Check whether the options contain the new power level."""
+            return is_option_value_equal("power", options.get("power", ""), power_level)
+
+        # Without names the client omits defaulted options, so ask for power
+        commands = [
+            f"{COMMAND_POWER} {power_level.value}",
+            f"{COMMAND_OPTIONS} -d power",
+        ]
+
+        async def prepare(
+            _name: str, _controller: FoldingAtHomeController
+        ) -> Preparation:
+            """Return the same commands for every controller."""
+            return commands, {PyOnMessageTypes.OPTIONS.value: condition}
+
+        return await self._run_async(group, prepare, timeout)
+
+    async def reconcile_options_async(
+        self,
+        desired: Mapping[str, Any],
+        group: Optional[str] = None,
+        host_options: Optional[Mapping[str, Mapping[str, Any]]] = None,
+        slot_options: Optional[Mapping[str, Any]] = None,
+        slot_filter: Optional[Callable[[dict], bool]] = None,
+        timeout: float = ACKNOWLEDGEMENT_TIMEOUT_IN_SECONDS,
+    ) -> Dict[str, FleetCommandResult]:
+        """Bring the options of the selected clients to the desired values.
+
+        The desired options, overridden per host by host_options, are compared
+        with the latest options of each client. Those lack options at their
+        default value, so desired options missing there are queried with
+        'options -d' first. The slot_options of the slots matching slot_filter
+        are queried with one 'slot-options -d' per slot. Only the differing
+        options are sent in a single write, hosts without drift get no command
+        at all.
+        """
+
+        async def prepare(
+            name: str, controller: FoldingAtHomeController
+        ) -> Preparation:
+            """Build the options command for the drift of a controller."""
+            options = dict(desired)
+            options.update((host_options or {}).get(name, {}))
+            current = dict(
+                controller.get_latest_message(PyOnMessageTypes.OPTIONS.value) or {}
+            )
+            unknown = [option for option in options if option not in current]
+            if unknown:
+                current.update(await query_options_async(controller, unknown))
+            drift = get_option_drift(current, options)
+
+            def condition(options: Any) -> bool:
+                """Check whether the options contain all desired values."""
+                return not get_option_drift(options, drift)
+
+            commands: List[str] = []
+            conditions: Dict[str, Condition] = {}
+            if drift:
+                # The client lists the options it set, which acknowledges them
+                commands.append(format_options_command(drift))
+                conditions[PyOnMessageTypes.OPTIONS.value] = condition
+            if slot_options:
+                slot_commands, slot_condition = await prepare_slot_options_async(
+                    controller, slot_options, slot_filter
+                )
+                commands.extend(slot_commands)
+                if slot_condition is not None:
+                    conditions[PyOnMessageTypes.SLOT_OPTIONS.value] = slot_condition
+            return commands, conditions
+
+        return await self._run_async(group, prepare, timeout)
+
+    async def _set_slots_paused_async(
+        self,
+        paused: bool,
+        group: Optional[str],
+        slot_filter: Optional[Callable[[dict], bool]],
+        timeout: float,
+    ) -> Dict[str, FleetCommandResult]:
+        """Pause or unpause slots and wait until slot-info reflects it."""
+        command = COMMAND_PAUSE if paused else COMMAND_UNPAUSE
+
+        async def prepare(
+            _name: str, controller: FoldingAtHomeController
+        ) -> Preparation:
+            """Build the commands and acknowledgement condition for a controller."""
+            slot_ids: Optional[List[str]] = None
+            commands = [command, COMMAND_SLOT_INFO]
+            if slot_filter is not None:
+                slots = controller.get_latest_message(PyOnMessageTypes.SLOTS.value)
+                if slots is None:
+                    raise FoldingAtHomeControlException(
+                        "No slot information has been received yet."
+                    )
+                slot_ids = [slot["id"] for slot in slots if slot_filter(slot)]
+                commands = [f"{command} {slot_id}" for slot_id in slot_ids]
+                commands.append(COMMAND_SLOT_INFO)
+
+            def condition(slots: Any) -> bool:
+                """Check whether all affected slots are in the desired state."""
+                return all(
+                    (slot.get("status") == SLOT_STATUS_PAUSED) == paused
+                    for slot in slots
+                    if slot_ids is None or slot.get("id") in slot_ids
+                )
+
+            return commands, {PyOnMessageTypes.SLOTS.value: condition}
+
+        return await self._run_async(group, prepare, timeout)
+
+    async def _run_async(
+        self,
+        group: Optional[str],
+        prepare: Callable[[str, FoldingAtHomeController], Awaitable[Preparation]],
+        timeout: float,
+    ) -> Dict[str, FleetCommandResult]:
+        """Send commands concurrently and wait for their acknowledgement."""
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        deadline = asyncio.get_event_loop().time() + timeout
+
+        def remaining() -> float:
+            """Return the seconds left until the deadline."""
+            return deadline - asyncio.get_event_loop().time()
+
+        async def run_on_controller(
+            name: str, controller: FoldingAtHomeController
+        ) -> FleetCommandResult:
+            """Send the commands to one controller and wait for the result."""
+            try:
+                commands, conditions = await asyncio.wait_for(
+                    prepare(name, controller), max(remaining(), 0)
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                # Covers user supplied filters, one host must not abort the rest
+                _LOGGER.debug("Could not prepare command for %s: %r", name, error)
+                return FleetCommandResult(name, False, error)
+            if not commands:
+                return FleetCommandResult(name, True)
+            acknowledgements = [
+                controller.expect_message(message_type, condition)
+                for message_type, condition in conditions.items()
+            ]
+            try:
+                async with semaphore:
+                    await controller.send_command_async("\n".join(commands))
+                await asyncio.wait_for(
+                    asyncio.gather(*acknowledgements), max(remaining(), 0)
+                )
+            except (
+                FoldingAtHomeControlException,
+                OSError,
+                asyncio.TimeoutError,
+            ) as error:
+                _LOGGER.debug("Command on %s was not acknowledged: %r", name, error)
+                return FleetCommandResult(name, False, error)
+            finally:
+                for acknowledgement in acknowledgements:
+                    acknowledgement.cancel()
+            return FleetCommandResult(name, True)
+
+        results = await asyncio.gather(
+            *(
+                run_on_controller(name, controller)
+                for name, controller in self.select(group).items()
+            )
+        )
+        return {result.name: result for result in results}
+
+    @property
+    def controllers(self) -> Dict[str, FoldingAtHomeController]:
+        """The controllers of the fleet by name."""
+        return dict(self._controllers)
+
+    @property
+    def groups(self) -> Dict[str, Set[str]]:
+        """The names of the controllers in each group."""
+        return {group: set(members) for group, members in self._groups.items()}
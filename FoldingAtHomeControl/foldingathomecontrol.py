@@ -7,20 +7,25 @@ try:
 except ImportError:
     from asyncio import IncompleteReadError  # type: ignore
 import logging
-from typing import Callable, Optional
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
 from uuid import uuid4
 
 from .const import (
+    COMMAND_HEARTBEAT,
+    COMMAND_OPTIONS,
     COMMAND_PAUSE,
     COMMAND_POWER,
     COMMAND_REQUEST_WORKSERVER_ASSIGNMENT,
     COMMAND_SHUTDOWN,
+    COMMAND_SIMULATION_INFO,
+    COMMAND_TRAJECTORY,
     COMMAND_UNPAUSE,
-    PY_ON_ERROR,
-    PY_ON_MESSAGE_FOOTER,
-    PY_ON_MESSAGE_HEADER,
+    PY_ON_ERROR_BYTES,
+    PY_ON_MESSAGE_FOOTER_BYTES,
+    PY_ON_MESSAGE_HEADER_BYTES,
     SUBSCRIBE_COMMANDS,
-    UNAUTHENTICATED_INDICATOR,
+    UNAUTHENTICATED_INDICATOR_BYTES,
     UNSUBSCRIBE_ALL_COMMAND,
     PowerLevel,
     PyOnMessageTypes,
@@ -29,15 +34,18 @@ from .exceptions import (
     FoldingAtHomeControlAuthenticationRequired,
     FoldingAtHomeControlConnectionFailed,
     FoldingAtHomeControlNotConnected,
+    FoldingAtHomeControlReadTimeout,
 )
-from .pyonparser import convert_pyon_to_json
-from .serialconnection import SerialConnection
+from .pyonparser import PyOnStreamDecoder, convert_pyon_to_json
+from .serialconnection import BUFFER_LIMIT_IN_BYTES, SerialConnection
 
 _LOGGER = logging.getLogger(__name__)
 
 RETRY_WAIT_IN_SECONDS = 10
 MAX_AUTHENTICATION_MESSAGE_COUNT = 5
 CONNECT_TIMEOUT_IN_SECONDS = 5
+LIVENESS_GRACE_FACTOR = 2
+MAX_MESSAGE_SIZE_IN_BYTES = 2**24
 
 
 class FoldingAtHomeController:
@@ -49,17 +57,32 @@ class FoldingAtHomeController:
         port: int = 36330,
         password: Optional[str] = None,
         reconnect_enabled: bool = True,
-        read_timeout: int = 15,
+        read_timeout: float = 15,
         update_rate: int = 5,
+        buffer_limit: int = BUFFER_LIMIT_IN_BYTES,
+        max_message_size: int = MAX_MESSAGE_SIZE_IN_BYTES,
     ) -> None:
         """Initialize connection data."""
-        self._serialconnection = SerialConnection(address, port, password, read_timeout)
+        self._serialconnection = SerialConnection(
+            address, port, password, read_timeout, buffer_limit
+        )
         self._reconnect_enabled: bool = reconnect_enabled
+        self._max_message_size: int = max_message_size
+        self._closed: bool = False
+        # Created on first use, so it binds to the loop running the controller
+        self._closed_event_instance: Optional[asyncio.Event] = None
 
         self._callbacks: dict = {}
+        self._element_callbacks: Dict[str, dict] = {}
+        self._latest_messages: Dict[str, Tuple[float, Any]] = {}
+        self._stale_message_types: Set[str] = set()
         self._connect_task: Optional[asyncio.Future] = None
         self._on_disconnect: Optional[Callable] = None
         self._subscription_counter: int = 0
+        self._subscriptions: Dict[str, int] = {}
+        self._subscription_ids: Dict[str, int] = {}
+        # Names listed by sent 'options <names>' commands awaiting their reply
+        self._option_requests: List[Set[str]] = []
         self._update_rate = update_rate
 
     async def try_connect_async(self, timeout: int) -> None:
@@ -97,13 +120,25 @@ class FoldingAtHomeController:
             raise FoldingAtHomeControlConnectionFailed from incomplete_error
 
     async def connect_async(self) -> None:
-        """Try until connect succeeds."""
-        while not self.is_connected:
+        """Try until connect succeeds or the controller is closed."""
+        while not self.is_connected and not self._closed:
             try:
                 await self.try_connect_async(CONNECT_TIMEOUT_IN_SECONDS)
             except FoldingAtHomeControlConnectionFailed:
-                await asyncio.sleep(RETRY_WAIT_IN_SECONDS)
+                try:
+                    await asyncio.wait_for(
+                        self._closed_event.wait(), RETRY_WAIT_IN_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
             except asyncio.CancelledError as cancelled_error:
+                if (
+                    self._closed
+                    and self._connect_task is not None
+                    and self._connect_task.cancelled()
+                ):
+                    # The attempt was cancelled by close_async, not the caller
+                    return
                 await self.cleanup_async(cancelled_error)
 
     def on_disconnect(self, func: Callable) -> None:
@@ -122,7 +157,84 @@ class FoldingAtHomeController:
 
         return remove_callback
 
-    def set_read_timeout(self, timeout: int) -> None:
+    def expect_message(
+        self, message_type: str, condition: Callable[[Any], bool]
+    ) -> "asyncio.Future[Any]":
+        """Return a future resolved by the next matching message of a type."""
+        future: "asyncio.Future[Any]" = asyncio.get_event_loop().create_future()
+
+        def callback(received_message_type: str, message: Any) -> None:
+            """Resolve the future if the message fulfills the condition."""
+            if (
+                received_message_type == message_type
+                and not future.done()
+                and condition(message)
+            ):
+                future.set_result(message)
+
+        remove_callback = self.register_callback(callback)
+        future.add_done_callback(lambda _: remove_callback())
+        return future
+
+    def get_latest_message(self, message_type: str) -> Any:
+        """Return the latest received message of a type or None."""
+        if message_type not in self._latest_messages:
+            return None
+        return self._latest_messages[message_type][1]
+
+    def get_message_received_at(self, message_type: str) -> Optional[float]:
+        """Return when the latest message of a type was received or None."""
+        if message_type not in self._latest_messages:
+            return None
+        return self._latest_messages[message_type][0]
+
+    def is_message_stale(self, message_type: str) -> bool:
+        """Is the latest message of a type restored from a snapshot?"""
+        return message_type in self._stale_message_types
+
+    def snapshot(self) -> Dict[str, Tuple[float, Any]]:
+        """Return the latest message of each type with its receive time."""
+        return dict(self._latest_messages)
+
+    def restore_snapshot(self, snapshot: Mapping[str, Tuple[float, Any]]) -> None:
+        """Restore messages from a snapshot, marking them stale until updated."""
+        for message_type, (received_at, message) in snapshot.items():
+            if message_type not in self._latest_messages:
+                self._latest_messages[message_type] = (received_at, message)
+                self._stale_message_types.add(message_type)
+
+    def register_element_callback(
+        self,
+        message_type: str,
+        callback: Callable,
+        end_callback: Optional[Callable] = None,
+    ) -> Callable:
+        """Register a callback for the elements of messages of a type.
+
+        Messages of this type are decoded while they are received and every
+        element is passed to the callback instead of passing the whole message
+        to the regular callbacks. Members of dicts are passed as (key, value).
+        After each message end_callback is called with the message type and
+        whether the message was complete. It is False when the message was
+        dropped for its size, could not be decoded or the connection was lost.
+        """
+        uuid = uuid4()
+        self._element_callbacks.setdefault(message_type, {})[uuid] = (
+            callback,
+            end_callback,
+        )
+        _LOGGER.debug("Registered element callback for %s", message_type)
+
+        def remove_callback() -> None:
+            """Remove callback."""
+            callbacks = self._element_callbacks[message_type]
+            del callbacks[uuid]
+            if not callbacks:
+                del self._element_callbacks[message_type]
+
+        return remove_callback
+
+    def set_read_timeout(self, timeout: float) -> None:
         """Set the read timeout in seconds."""
         self._serialconnection.set_read_timeout(timeout)
 
@@ -138,21 +250,45 @@ class FoldingAtHomeController:
     ) -> None:
         """Start a subscription to commands."""
         subscriptions = []
+        subscription_ids = {}
         for command in commands:
-            subscription = f"updates add {self._get_next_subscription_id()} {self._update_rate} ${command}"  # pylint: disable=line-too-long # noqa: line-too-long
+            subscription_ids[command] = self._get_next_subscription_id()
+            subscription = f"updates add {subscription_ids[command]} {self._update_rate} ${command}"  # pylint: disable=line-too-long # noqa: line-too-long
             subscriptions.append(subscription)
 
         await self._send_commands_async(subscriptions)
+        for command in commands:
+            self._subscriptions[command] = self._update_rate
+        self._subscription_ids.update(subscription_ids)
+
+    async def set_command_update_rate_async(
+        self, command: str, update_rate: int
+    ) -> None:
+        """Change the update rate of the subscription to a single command.
+
+        The subscription is replaced by adding it again under its id, so the
+        other subscriptions keep running.
+        """
+        subscription_id = self._subscription_ids.get(command)
+        if subscription_id is None:
+            subscription_id = self._get_next_subscription_id()
+        await self.send_command_async(
+            f"updates add {subscription_id} {update_rate} ${command}"
+        )
+        self._subscriptions[command] = update_rate
+        self._subscription_ids[command] = subscription_id
 
     async def unsubscribe_all_async(self) -> None:
         """Unsubscribe all subscriptions."""
         await self.send_command_async(UNSUBSCRIBE_ALL_COMMAND)
+        self._subscriptions.clear()
+        self._subscription_ids.clear()
 
     async def start(self, connect: bool = True, subscribe: bool = True) -> None:
-        """Start listening to the socket."""
+        """Start listening to the socket until the controller is closed."""
         if connect:
             await self.connect_async()
-        if subscribe:
+        if subscribe and not self._closed:
             await self.subscribe_async()
         while self.is_connected:
             try:
@@ -161,6 +297,8 @@ class FoldingAtHomeController:
                 IncompleteReadError,
                 FoldingAtHomeControlConnectionFailed,
             ):
+                if self._closed:
+                    break
                 await self._call_on_disconnect_async()
             except asyncio.CancelledError as cancelled_error:
                 _LOGGER.debug("Got cancelled.")
@@ -191,29 +329,43 @@ class FoldingAtHomeController:
         """Unpause all slots."""
         await self.send_command_async(COMMAND_UNPAUSE)
 
+    async def request_trajectory_async(self, slot_id: str) -> None:
+        """Request the current protein trajectory of a slot."""
+        await self.send_command_async(f"{COMMAND_TRAJECTORY} {slot_id}")
+
+    async def request_simulation_info_async(self, slot_id: str) -> None:
+        """Request the current simulation information of a slot."""
+        await self.send_command_async(f"{COMMAND_SIMULATION_INFO} {slot_id}")
+
     async def shutdown(self) -> None:
         """Shutdown the client."""
         await self.send_command_async(COMMAND_SHUTDOWN)
 
     async def _try_parse_pyon_message_async(self) -> None:
         """Read from the socket until a full message has been received."""
-        raw_message = await self._serialconnection.read_async()
+        raw_message = await self._read_async()
         _LOGGER.debug("Received message: %s", raw_message)
-        if PY_ON_MESSAGE_HEADER in raw_message:
-            raw_messages = []
+        if PY_ON_MESSAGE_HEADER_BYTES in raw_message:
             message_type = get_message_type_from_message(raw_message)
-            while PY_ON_MESSAGE_FOOTER not in raw_message:
-                raw_message = await self._serialconnection.read_async()
-                raw_messages.append(raw_message)
-            raw_messages.pop()  # Remove PY_ON_MESSAGE_FOOTER
-            message = "".join(raw_messages)
-            json_object = convert_pyon_to_json(message)
+            if message_type in self._element_callbacks:
+                await self._stream_pyon_message_async(message_type)
+                return
+            message = await self._read_pyon_message_async(message_type)
+            if message is None:
+                return
+            json_object = convert_pyon_to_json(
+                memoryview(message)[: -len(PY_ON_MESSAGE_FOOTER_BYTES)]
+            )
+            if message_type == PyOnMessageTypes.OPTIONS.value:
+                json_object = self._merge_option_reply(json_object)
+            self._latest_messages[message_type] = (time.time(), json_object)
+            self._stale_message_types.discard(message_type)
             await self._call_callbacks_async(message_type, json_object)
-        elif PY_ON_ERROR in raw_message:
-            error_message = raw_message.strip()
+        elif PY_ON_ERROR_BYTES in raw_message:
+            error_message = raw_message.strip().decode()
             _LOGGER.debug("Received error: %s", error_message)
             if (
-                UNAUTHENTICATED_INDICATOR in raw_message
+                UNAUTHENTICATED_INDICATOR_BYTES in raw_message
                 and not self._serialconnection.is_authenticated
             ):
                 _LOGGER.debug("This could mean a password is needed.")
@@ -224,9 +376,145 @@ class FoldingAtHomeController:
                 PyOnMessageTypes.ERROR.value, error_message
             )
 
-    async def _call_callbacks_async(self, message_type: str, message: str) -> None:
+    async def _read_pyon_message_async(self, message_type: str) -> Optional[bytes]:
+        """Read a message payload, discarding it if it exceeds the size limit."""
+        chunks = []
+        size = 0
+        async for chunk in self._serialconnection.read_chunks_async(
+            PY_ON_MESSAGE_FOOTER_BYTES
+        ):
+            size += len(chunk)
+            if size <= self._max_message_size:
+                chunks.append(chunk)
+        if size > self._max_message_size:
+            _LOGGER.warning(
+                "Discarded %s message of %d bytes exceeding the limit of %d bytes",
+                message_type,
+                size,
+                self._max_message_size,
+            )
+            return None
+        return b"".join(chunks)
+
+    async def _stream_pyon_message_async(self, message_type: str) -> None:
+        """Decode a message while receiving it and pass on each element.
+
+        The end callbacks learn whether the whole message was passed on.
+        """
+        try:
+            complete = await self._decode_streamed_message_async(message_type)
+        except (IncompleteReadError, FoldingAtHomeControlConnectionFailed):
+            await self._call_element_end_callbacks_async(message_type, False)
+            raise
+        await self._call_element_end_callbacks_async(message_type, complete)
+
+    async def _decode_streamed_message_async(self, message_type: str) -> bool:
+        """Pass on the elements of a message, returning whether it was complete.
+
+        Once the message exceeds the size limit or can not be decoded, the
+        rest of it is read and dropped.
+        """
+        decoder: Optional[PyOnStreamDecoder] = PyOnStreamDecoder(self._max_message_size)
+        size = 0
+        async for chunk in self._serialconnection.read_chunks_async(
+            PY_ON_MESSAGE_FOOTER_BYTES
+        ):
+            size += len(chunk)
+            if decoder is None:
+                continue
+            if size > self._max_message_size:
+                _LOGGER.warning(
+                    "Dropped the rest of a %s message exceeding the limit of %d bytes",
+                    message_type,
+                    self._max_message_size,
+                )
+                decoder = None
+                continue
+            final = chunk.endswith(PY_ON_MESSAGE_FOOTER_BYTES)
+            if final:
+                chunk = chunk[: -len(PY_ON_MESSAGE_FOOTER_BYTES)]
+            try:
+                elements = decoder.feed(chunk, final)
+            except ValueError as error:
+                _LOGGER.warning(
+                    "Dropped undecodable %s message: %s", message_type, error
+                )
+                decoder = None
+                continue
+            for element in elements:
+                for callback, _ in list(
+                    self._element_callbacks.get(message_type, {}).values()
+                ):
+                    if asyncio.iscoroutinefunction(callback):
+                        await callback(message_type, element)
+                    else:
+                        callback(message_type, element)
+        return decoder is not None
+
+    async def _call_element_end_callbacks_async(
+        self, message_type: str, complete: bool
+    ) -> None:
+        """Tell the end callbacks of a message type whether it was complete."""
+        for _, end_callback in list(
+            self._element_callbacks.get(message_type, {}).values()
+        ):
+            if end_callback is None:
+                continue
+            if asyncio.iscoroutinefunction(end_callback):
+                await end_callback(message_type, complete)
+            else:
+                end_callback(message_type, complete)
+
+    async def _read_async(self) -> bytes:
+        """Read the next line, probing with a heartbeat if traffic is overdue."""
+        try:
+            return await self._serialconnection.read_line_async(
+                self.liveness_timeout, disconnect_on_timeout=False
+            )
+        except FoldingAtHomeControlReadTimeout:
+            _LOGGER.debug(
+                "No traffic from %s:%d for %.0fs, sending heartbeat probe",
+                self._serialconnection.address,
+                self._serialconnection.port,
+                self.liveness_timeout,
+            )
+        await self._serialconnection.probe_async(COMMAND_HEARTBEAT)
+        return await self._serialconnection.read_line_async()
+
+    def _merge_option_reply(self, options: Any) -> Any:
+        """Merge a reply listing only the options named by a sent command.
+
+        The replies to commands like 'options name=value' or 'options -d name'
+        only list the named options, they are merged into the latest options.
+        Any other listing, like a subscription update, replaces them.
+        """
+        if not isinstance(options, dict) or not self._option_requests:
+            return options
+        if not set(options) <= self._option_requests[0]:
+            return options
+        self._option_requests.pop(0)
+        latest = self.get_latest_message(PyOnMessageTypes.OPTIONS.value)
+        if not isinstance(latest, dict):
+            return options
+        return {**latest, **options}
+
+    def _track_option_requests(self, command: str) -> None:
+        """Remember the option names listed by the reply to a command."""
+        for line in command.split("\n"):
+            parts = line.split()
+            if not parts or parts[0] != COMMAND_OPTIONS:
+                continue
+            names = {
+                argument.split("=", 1)[0].rstrip("!")
+                for argument in parts[1:]
+                if not argument.startswith("-")
+            }
+            if names and "*" not in names:
+                self._option_requests.append(names)
+
+    async def _call_callbacks_async(self, message_type: str, message: Any) -> None:
         """Pass the message to all callbacks."""
-        for callback in self._callbacks.values():
+        for callback in list(self._callbacks.values()):
             if asyncio.iscoroutinefunction(callback):
                 await callback(message_type, message)
             else:
@@ -235,6 +523,7 @@ class FoldingAtHomeController:
     async def _call_on_disconnect_async(self) -> None:
         """Call and if needed await on_disconnect callback."""
         self._reset_subscription_counter()
+        self._option_requests.clear()
         if self._on_disconnect is not None:
             if asyncio.iscoroutinefunction(self._on_disconnect):
                 await self._on_disconnect()
@@ -253,6 +542,8 @@ class FoldingAtHomeController:
     def _reset_subscription_counter(self) -> None:
         """Reset the subscription counter to 0."""
         self._subscription_counter = 0
+        self._subscriptions.clear()
+        self._subscription_ids.clear()
 
     async def cleanup_async(
         self, cancelled_error: Optional[CancelledError] = None
@@ -267,10 +558,32 @@ class FoldingAtHomeController:
         if cancelled_error is not None:
             raise cancelled_error
 
+    async def close_async(self, timeout: Optional[float] = None) -> bool:
+        """Close the connection for good without reconnecting.
+
+        The connection is aborted if it does not close within timeout seconds.
+        A running start() returns once the connection is closed. Returns
+        whether an open connection was closed cleanly, so a controller which
+        was not connected reports False.
+        """
+        was_connected = self.is_connected
+        self._closed = True
+        self._reconnect_enabled = False
+        self._closed_event.set()
+        if self._connect_task is not None and not self._connect_task.done():
+            self._connect_task.cancel()
+            try:
+                await self._connect_task
+            except asyncio.CancelledError:
+                pass
+        closed_cleanly = await self._serialconnection.cleanup_async(timeout)
+        return was_connected and closed_cleanly
+
     async def send_command_async(self, command: str) -> None:
         """Send a command."""
         if not self.is_connected:
             raise FoldingAtHomeControlNotConnected
+        self._track_option_requests(command)
         await self._serialconnection.send_async(f"{command}\n")
 
     async def _send_commands_async(self, commands: list) -> None:
@@ -280,22 +593,46 @@ class FoldingAtHomeController:
         command_package = "\n".join(commands) + "\n"
         await self._serialconnection.send_async(command_package)
 
+    @property
+    def _closed_event(self) -> asyncio.Event:
+        """The event set by close_async, created inside the running loop."""
+        if self._closed_event_instance is None:
+            self._closed_event_instance = asyncio.Event()
+        return self._closed_event_instance
+
     @property
     def is_connected(self) -> bool:
         """Is the client connected."""
         return self._serialconnection.is_connected
 
     @property
-    def read_timeout(self) -> int:
+    def read_timeout(self) -> float:
         """The configured read timeout in seconds."""
         return self._serialconnection.read_timeout
 
+    @property
+    def liveness_timeout(self) -> float:
+        """Seconds of silence after which the client is probed with a heartbeat.
+
+        With a heartbeat subscription traffic is expected at its rate, so the
+        timeout grows with it instead of tearing down slow subscriptions.
+        """
+        heartbeat_rate = self._subscriptions.get(COMMAND_HEARTBEAT)
+        if heartbeat_rate is None:
+            return self.read_timeout
+        return max(self.read_timeout, heartbeat_rate * LIVENESS_GRACE_FACTOR)
+
     @property
     def update_rate(self) -> int:
         """The subscription update rate in seconds."""
         return self._update_rate
 
+    @property
+    def subscriptions(self) -> Dict[str, int]:
+        """The update rates of the subscribed commands in seconds."""
+        return dict(self._subscriptions)
+
 
-def get_message_type_from_message(message: str) -> str:
+def get_message_type_from_message(message: bytes) -> str:
     """Parses the message_type from the message."""
-    return message.split(" ")[2].replace("\n", "")
+    return message.split(b" ")[2].strip().decode()
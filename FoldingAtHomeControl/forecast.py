@@ -0,0 +1,191 @@
+"""Forecast completion and credit of the work units of a fleet."""
+import math
+import re
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .const import PyOnMessageTypes
+from .foldingathomecontrol import FoldingAtHomeController
+
+INTERVAL_PATTERN = re.compile(r"([\d.]+)\s*(day|hour|min|sec)")
+INTERVAL_UNITS_IN_SECONDS = {"day": 86400.0, "hour": 3600.0, "min": 60.0, "sec": 1.0}
+DEADLINE_MARGIN_IN_SECONDS = 3600.0
+
+UnitKey = Tuple[str, str]
+
+
+def parse_interval(value: Any) -> float:
+    """Parse an interval like '1 hours 04 mins' to seconds or nan."""
+    matches = INTERVAL_PATTERN.findall(str(value))
+    if not matches:
+        return math.nan
+    return sum(
+        float(amount) * INTERVAL_UNITS_IN_SECONDS[unit] for amount, unit in matches
+    )
+
+
+def parse_number(value: Any) -> float:
+    """Parse a number like '72.51%' or '359072' or return nan."""
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return math.nan
+
+
+@dataclass
+class Forecast:
+    """Forecasts for all units, one entry per unit in each column."""
+
+    keys: List[UnitKey]
+    completion_times: List[float]
+    at_risk: List[bool]
+    credit_per_hour: List[float]
+    credit_estimates: List[float]
+
+    @property
+    def total_credit_per_hour(self) -> float:
+        """The projected credit per hour of the whole fleet."""
+        return math.fsum(value for value in self.credit_per_hour if value == value)
+
+
+class FleetForecast:
+    """Keep the progress of all units in columns and forecast from them.
+
+    Unit messages are parsed once when they arrive and stored in flat arrays
+    indexed by row, so recomputing the forecast is a single pass over the
+    columns instead of re-parsing the unit dicts of every host. The pass is
+    plain Python, see benchmarks/forecast.py for its cost at fleet scale.
+    """
+
+    def __init__(self, deadline_margin: float = DEADLINE_MARGIN_IN_SECONDS) -> None:
+        """Initialize empty columns."""
+        self._deadline_margin: float = deadline_margin
+        self._rows: Dict[UnitKey, int] = {}
+        self._keys: List[Optional[UnitKey]] = []
+        self._free_rows: List[int] = []
+        self._host_keys: Dict[str, Set[UnitKey]] = {}
+
+        self._percent_done = array("d")
+        self._progressed_at = array("d")
+        self._rate = array("d")
+        self._eta_completion = array("d")
+        self._deadline = array("d")
+        self._ppd = array("d")
+        self._credit_estimate = array("d")
+
+    def attach(self, name: str, controller: FoldingAtHomeController) -> Callable:
+        """Update the forecast from the unit messages of a controller."""
+
+        def callback(message_type: str, message: Any) -> None:
+            """Pass unit messages on to the forecast."""
+            if message_type == PyOnMessageTypes.UNITS.value:
+                self.update_units(name, message)
+
+        return controller.register_callback(callback)
+
+    def update_units(
+        self, host: str, units: Iterable[dict], received_at: Optional[float] = None
+    ) -> None:
+        """Replace the units of a host with the units of a queue-info message."""
+        if received_at is None:
+            received_at = time.time()
+        keyed_units = {
+            (host, str(unit.get("unit") or unit.get("id"))): unit for unit in units
+        }
+        # Free the rows of finished units first so new units can reuse them
+        for key in self._host_keys.get(host, set()) - keyed_units.keys():
+            self._remove_row(key)
+        for key, unit in keyed_units.items():
+            self._update_row(key, unit, received_at)
+        self._host_keys[host] = set(keyed_units)
+
+    def remove_host(self, host: str) -> None:
+        """Forget all units of a host."""
+        for key in self._host_keys.pop(host, set()):
+            self._remove_row(key)
+
+    def forecast(self) -> Forecast:
+        """Compute completion times, deadline risks and credit per hour."""
+        rows = [row for row, key in enumerate(self._keys) if key is not None]
+        percent_done, progressed_at = self._percent_done, self._progressed_at
+        rates, eta_completions = self._rate, self._eta_completion
+        # Prefer the observed progress rate, fall back to the client's eta
+        completion_times = [
+            progressed_at[row] + (100.0 - percent_done[row]) / rates[row]
+            if rates[row] > 0
+            else eta_completions[row]
+            for row in rows
+        ]
+        deadlines, margin = self._deadline, self._deadline_margin
+        at_risk = [
+            completion_times[index] + margin > deadlines[row]
+            for index, row in enumerate(rows)
+        ]
+        return Forecast(
+            [self._keys[row] for row in rows],  # type: ignore
+            completion_times,
+            at_risk,
+            [self._ppd[row] / 24.0 for row in rows],
+            [self._credit_estimate[row] for row in rows],
+        )
+
+    def _update_row(self, key: UnitKey, unit: dict, received_at: float) -> None:
+        """Store the parsed progress of a unit in its row."""
+        percent_done = parse_number(unit.get("percentdone"))
+        if math.isnan(percent_done) and unit.get("totalframes"):
+            percent_done = 100.0 * unit.get("framesdone", 0) / unit["totalframes"]
+        row = self._rows.get(key)
+        if row is None:
+            row = self._allocate_row(key)
+            self._percent_done[row] = percent_done
+            self._progressed_at[row] = received_at
+            self._rate[row] = math.nan
+        elif percent_done != self._percent_done[row]:
+            elapsed = received_at - self._progressed_at[row]
+            progress = percent_done - self._percent_done[row]
+            self._rate[row] = progress / elapsed if elapsed > 0 < progress else math.nan
+            self._percent_done[row] = percent_done
+            self._progressed_at[row] = received_at
+        self._eta_completion[row] = received_at + parse_interval(unit.get("eta"))
+        self._deadline[row] = received_at + parse_interval(unit.get("timeremaining"))
+        self._ppd[row] = parse_number(unit.get("ppd"))
+        self._credit_estimate[row] = parse_number(unit.get("creditestimate"))
+
+    def _allocate_row(self, key: UnitKey) -> int:
+        """Return a free row for a new unit."""
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._keys[row] = key
+        else:
+            row = len(self._keys)
+            self._keys.append(key)
+            for column in self._columns:
+                column.append(math.nan)
+        self._rows[key] = row
+        return row
+
+    def _remove_row(self, key: UnitKey) -> None:
+        """Free the row of a unit."""
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._keys[row] = None
+            self._free_rows.append(row)
+
+    @property
+    def _columns(self) -> Tuple[array, ...]:
+        """All columns of the forecast."""
+        return (
+            self._percent_done,
+            self._progressed_at,
+            self._rate,
+            self._eta_completion,
+            self._deadline,
+            self._ppd,
+            self._credit_estimate,
+        )
+
+    def __len__(self) -> int:
+        """The number of tracked units."""
+        return len(self._rows)
@@ -0,0 +1,284 @@
+"""Share one Folding@Home Client connection among many local clients."""
+import asyncio
+import logging
+from asyncio import AbstractServer, StreamReader, StreamWriter
+from typing import Any, Callable, Dict, Optional, Set
+
+from .const import (
+    COMMAND_PAUSE,
+    COMMAND_REQUEST_WORKSERVER_ASSIGNMENT,
+    COMMAND_SHUTDOWN,
+    COMMAND_SIMULATION_INFO,
+    COMMAND_SLOT_OPTIONS,
+    COMMAND_TRAJECTORY,
+    COMMAND_UNPAUSE,
+    PY_ON_MESSAGE_FOOTER_BYTES,
+    PY_ON_MESSAGE_HEADER_BYTES,
+    SUBSCRIPTION_MESSAGE_TYPES,
+    UNAUTHENTICATED_INDICATOR_BYTES,
+)
+from .exceptions import FoldingAtHomeControlException
+from .foldingathomecontrol import FoldingAtHomeController
+from .pyonparser import convert_json_to_pyon
+
+_LOGGER = logging.getLogger(__name__)
+
+WELCOME_MESSAGE = b"\x1b[H\x1b[2JWelcome to the Folding@home Client command server.\n"
+PROXY_PORT = 36331
+MAX_WRITE_BUFFER_SIZE_IN_BYTES = 2**22
+QUERY_TIMEOUT_IN_SECONDS = 10
+
+# Commands the client does not answer, they are forwarded as they are
+FORWARDED_COMMANDS = (
+    COMMAND_PAUSE,
+    COMMAND_UNPAUSE,
+    COMMAND_REQUEST_WORKSERVER_ASSIGNMENT,
+    COMMAND_SHUTDOWN,
+    "finish",
+    "option",
+    "on_idle",
+    "always_on",
+    "save",
+)
+# Commands the client answers with a message of the same type
+FORWARDED_QUERY_COMMANDS = (
+    COMMAND_SIMULATION_INFO,
+    COMMAND_SLOT_OPTIONS,
+    COMMAND_TRAJECTORY,
+    "info",
+    "num-slots",
+    "ppd",
+    COMMAND_SLOT_OPTIONS,
+)
+
+
+def encode_pyon_message(message_type: str, message: Any) -> bytes:
+    """Encode a message the way the client sends it."""
+    return b"".join(
+        (
+            PY_ON_MESSAGE_HEADER_BYTES,
+            f" {message_type}\n{convert_json_to_pyon(message)}".encode(),
+            PY_ON_MESSAGE_FOOTER_BYTES,
+        )
+    )
+
+
+class DownstreamClient:
+    """A local client connected to the proxy."""
+
+    def __init__(self, writer: StreamWriter, authenticated: bool) -> None:
+        """Initialize the client state."""
+        self.writer: StreamWriter = writer
+        self.authenticated: bool = authenticated
+        self.subscriptions: Dict[str, str] = {}
+
+
+class FoldingAtHomeProxy:
+    """Serve the messages of one controller to many local clients.
+
+    Subscriptions and queries of the local clients are answered from the
+    messages the controller receives through its single upstream connection.
+    Other known commands are forwarded upstream and their answers are sent
+    back to the client which asked, unknown commands are rejected.
+    """
+
+    def __init__(
+        self,
+        controller: FoldingAtHomeController,
+        host: str = "127.0.0.1",
+        port: int = PROXY_PORT,
+        password: Optional[str] = None,
+        max_write_buffer_size: int = MAX_WRITE_BUFFER_SIZE_IN_BYTES,
+    ) -> None:
+        """Initialize the proxy."""
+        self._controller = controller
+        self._host: str = host
+        self._port: int = port
+        self._password: Optional[str] = password
+        self._max_write_buffer_size: int = max_write_buffer_size
+
+        self._server: Optional[AbstractServer] = None
+        self._remove_callback: Optional[Callable] = None
+        self._subscribers: Dict[str, Set[DownstreamClient]] = {}
+        self._clients: Set[DownstreamClient] = set()
+
+    async def start_async(self) -> None:
+        """Start accepting local clients."""
+        self._remove_callback = self._controller.register_callback(self._on_message)
+        self._server = await asyncio.start_server(
+            self._handle_client_async, self._host, self._port
+        )
+        self._port = self._server.sockets[0].getsockname()[1]
+        _LOGGER.debug("Proxy listening on %s:%d", self._host, self._port)
+
+    async def close_async(self) -> None:
+        """Stop accepting clients and disconnect all of them."""
+        if self._remove_callback is not None:
+            self._remove_callback()
+            self._remove_callback = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for client in list(self._clients):
+            client.writer.close()
+
+    def _on_message(self, message_type: str, message: Any) -> None:
+        """Fan a message out to all clients subscribed to its type."""
+        subscribers = self._subscribers.get(message_type)
+        if not subscribers:
+            return
+        data = encode_pyon_message(message_type, message)
+        for client in list(subscribers):
+            self._write(client, data)
+
+    def _write(self, client: DownstreamClient, data: bytes) -> None:
+        """Write to a client, dropping it if it does not keep up."""
+        transport = client.writer.transport
+        if transport.get_write_buffer_size() > self._max_write_buffer_size:
+            _LOGGER.warning("Dropping proxy client which does not read its messages")
+            self._unsubscribe_all(client)
+            transport.abort()
+            return
+        client.writer.write(data)
+
+    async def _handle_client_async(
+        self, reader: StreamReader, writer: StreamWriter
+    ) -> None:
+        """Serve a local client until it disconnects."""
+        client = DownstreamClient(writer, self._password is None)
+        self._clients.add(client)
+        writer.write(WELCOME_MESSAGE)
+        try:
+            while True:
+                line = await reader.readuntil(b"\n")
+                command = line.decode(errors="replace").strip()
+                if not await self._handle_command_async(client, command):
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+            pass
+        finally:
+            self._unsubscribe_all(client)
+            self._clients.discard(client)
+            writer.close()
+
+    async def _handle_command_async(
+        self, client: DownstreamClient, command: str
+    ) -> bool:
+        """Handle a command of a client, returning False if it wants to leave."""
+        name, _, arguments = command.partition(" ")
+        if name in ("exit", "quit"):
+            return False
+        if name == "auth":
+            client.authenticated = client.authenticated or arguments == self._password
+            client.writer.write(b"OK\n" if client.authenticated else b"FAILED\n")
+        elif not name:
+            pass
+        elif not client.authenticated:
+            client.writer.write(b"ERROR: " + UNAUTHENTICATED_INDICATOR_BYTES + b"\n")
+        elif name == "updates":
+            self._handle_updates(client, arguments)
+        elif name in SUBSCRIPTION_MESSAGE_TYPES and not arguments:
+            await self._answer_query_async(client, SUBSCRIPTION_MESSAGE_TYPES[name])
+        elif name in SUBSCRIPTION_MESSAGE_TYPES:
+            await self._forward_query_async(
+                client, command, SUBSCRIPTION_MESSAGE_TYPES[name]
+            )
+        elif name in FORWARDED_QUERY_COMMANDS:
+            await self._forward_query_async(client, command, name)
+        elif name in FORWARDED_COMMANDS:
+            await self._forward_async(client, command)
+        else:
+            client.writer.write(f"ERROR: unsupported command '{name}'\n".encode())
+        return True
+
+    def _handle_updates(self, client: DownstreamClient, arguments: str) -> None:
+        """Add or remove subscriptions of a client."""
+        action, _, arguments = arguments.partition(" ")
+        if action == "add":
+            parts = arguments.split(" ", 2)
+            message_type = None
+            if len(parts) == 3:
+                message_type = SUBSCRIPTION_MESSAGE_TYPES.get(parts[2].lstrip("$"))
+            if message_type is None:
+                client.writer.write(
+                    f"ERROR: unsupported subscription '{arguments}'\n".encode()
+                )
+                return
+            subscription_id = parts[0]
+            self._unsubscribe(client, subscription_id)
+            client.subscriptions[subscription_id] = message_type
+            self._subscribers.setdefault(message_type, set()).add(client)
+            message = self._controller.get_latest_message(message_type)
+            if message is not None:
+                self._write(client, encode_pyon_message(message_type, message))
+        elif action == "del":
+            self._unsubscribe(client, arguments)
+        elif action == "clear":
+            self._unsubscribe_all(client)
+
+    async def _answer_query_async(
+        self, client: DownstreamClient, message_type: str
+    ) -> None:
+        """Answer a query from the cache or wait for the upstream answer."""
+        message = self._controller.get_latest_message(message_type)
+        if message is None:
+            command = next(
+                command
+                for command, subscribed_type in SUBSCRIPTION_MESSAGE_TYPES.items()
+                if subscribed_type == message_type
+            )
+            await self._forward_query_async(client, command, message_type)
+            return
+        self._write(client, encode_pyon_message(message_type, message))
+
+    async def _forward_query_async(
+        self, client: DownstreamClient, command: str, message_type: str
+    ) -> None:
+        """Forward a command and send the next answer of its type to the client."""
+        answer = self._controller.expect_message(message_type, lambda _: True)
+        try:
+            await self._controller.send_command_async(command)
+            message = await asyncio.wait_for(answer, QUERY_TIMEOUT_IN_SECONDS)
+        except (
+            FoldingAtHomeControlException,
+            OSError,
+            asyncio.TimeoutError,
+        ) as error:
+            self._write_error(client, error)
+            return
+        finally:
+            answer.cancel()
+        self._write(client, encode_pyon_message(message_type, message))
+
+    async def _forward_async(self, client: DownstreamClient, command: str) -> None:
+        """Forward a command to the upstream client."""
+        try:
+            await self._controller.send_command_async(command)
+        except (FoldingAtHomeControlException, OSError) as error:
+            self._write_error(client, error)
+
+    def _write_error(self, client: DownstreamClient, error: BaseException) -> None:
+        """Report an upstream failure to a client."""
+        _LOGGER.debug("Upstream command failed: %r", error)
+        client.writer.write(f"ERROR: upstream {type(error).__name__}\n".encode())
+
+    def _unsubscribe(self, client: DownstreamClient, subscription_id: str) -> None:
+        """Remove a single subscription of a client."""
+        message_type = client.subscriptions.pop(subscription_id, None)
+        if message_type is not None and message_type not in (
+            client.subscriptions.values()
+        ):
+            self._subscribers.get(message_type, set()).discard(client)
+
+    def _unsubscribe_all(self, client: DownstreamClient) -> None:
+        """Remove all subscriptions of a client."""
+        for message_type in set(client.subscriptions.values()):
+            self._subscribers.get(message_type, set()).discard(client)
+        client.subscriptions.clear()
+
+    @property
+    def port(self) -> int:
+        """The port the proxy listens on."""
+        return self._port
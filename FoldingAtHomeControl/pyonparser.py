@@ -1,18 +1,173 @@
 """Parse pyonmessages."""
 
+import codecs
 import json
 import re
-from typing import Any
+from typing import Any, List, Optional, Union
 
+FALSE_PATTERN = re.compile(r"\:\s*False")
+TRUE_PATTERN = re.compile(r"\:\s*True")
+SEPARATOR_PATTERN = re.compile(r"\s*:")
+NON_WHITESPACE_PATTERN = re.compile(r"\S")
+STRING_SPECIAL_PATTERN = re.compile(r'["\\]')
+# Skip everything up to the next bracket or separator in a single match,
+# including complete strings. A quote left over starts an unfinished string.
+SKIP_PATTERN = re.compile(r'(?:[^"\[\]{},]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+NESTED_SKIP_PATTERN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+JSON_FALSE_PATTERN = re.compile(r"\:\s*false")
+JSON_TRUE_PATTERN = re.compile(r"\:\s*true")
 
-def convert_pyon_to_json(message: str) -> Any:
-    """Converts PyON to JSON."""
-    # Convert False to false
-    pattern = re.compile(r"\:\s*False")
-    message = re.sub(pattern, ":false", message)
 
+def convert_pyon_to_json(message: Union[str, bytes, memoryview]) -> Any:
+    """Converts PyON to JSON.
+
+    Bytes are decoded in a single pass and the payload is only rewritten if it
+    actually contains a Python boolean.
+    """
+    if not isinstance(message, str):
+        message = str(message, "utf-8")
+    return json.loads(convert_pyon_booleans(message))
+
+
+def convert_pyon_booleans(message: str) -> str:
+    """Converts the Python booleans in a PyON message to JSON booleans."""
     # Convert False to false
-    pattern = re.compile(r"\:\s*True")
-    message = re.sub(pattern, ":true", message)
+    if "False" in message:
+        message = FALSE_PATTERN.sub(":false", message)
+
+    # Convert True to true
+    if "True" in message:
+        message = TRUE_PATTERN.sub(":true", message)
+
+    return message
+
+
+def convert_json_to_pyon(message: Any) -> str:
+    """Converts a decoded message back to PyON."""
+    pyon = json.dumps(message, indent=2)
+    if "false" in pyon:
+        pyon = JSON_FALSE_PATTERN.sub(": False", pyon)
+    if "true" in pyon:
+        pyon = JSON_TRUE_PATTERN.sub(": True", pyon)
+    return pyon
+
+
+class PyOnStreamDecoder:
+    """Incrementally decode a PyON message which is fed in chunks.
+
+    Elements of a top-level list, members of a top-level dict as (key, value)
+    tuples or a top-level scalar are returned as soon as they are complete.
+    Every character is scanned once to find where the current element ends
+    and each element is decoded once, so only the element currently being
+    received is held in memory. Elements larger than max_element_size
+    characters raise a ValueError.
+    """
+
+    def __init__(self, max_element_size: Optional[int] = None) -> None:
+        """Initialize the decoder state."""
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._max_element_size: Optional[int] = max_element_size
+        self._parts: List[str] = []
+        self._size: int = 0
+        self._container: Optional[str] = None
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._escaped: bool = False
+        self._done: bool = False
+
+    def feed(self, data: bytes, final: bool = False) -> List[Any]:
+        """Feed the next chunk and return the elements it completed."""
+        elements: List[Any] = []
+        self._scan(self._text_decoder.decode(data, final), elements)
+        if final and not self._done:
+            text = "".join(self._parts).strip()
+            if self._container == "":
+                self._parts, self._size = [], 0
+                elements.append(json.loads(convert_pyon_booleans(text)))
+            elif self._container is not None:
+                raise json.JSONDecodeError("Incomplete PyON message", text, len(text))
+        return elements
+
+    def _scan(self, text: str, elements: List[Any]) -> None:
+        """Scan text for the ends of elements and decode the completed ones."""
+        if self._done:
+            return
+        position = self._start_container(text) if self._container is None else 0
+        if not self._container:
+            self._append(text[position:])
+            return
+        start = position
+        while position < len(text):
+            if self._in_string:
+                position = self._skip_string(text, position)
+                continue
+            pattern = NESTED_SKIP_PATTERN if self._depth else SKIP_PATTERN
+            position = pattern.match(text, position).end()  # type: ignore
+            if position == len(text):
+                break
+            character = text[position]
+            position += 1
+            if character == '"':
+                self._in_string = True
+            elif character in "[{":
+                self._depth += 1
+            elif character in "]}" and self._depth > 0:
+                self._depth -= 1
+            elif character in "]}" or (character == "," and self._depth == 0):
+                self._append(text[start : position - 1])
+                self._emit(elements)
+                start = position
+                if character != ",":
+                    self._done = True
+                    return
+        self._append(text[start:])
+
+    def _start_container(self, text: str) -> int:
+        """Detect the top-level container and return the position after it."""
+        match = NON_WHITESPACE_PATTERN.search(text)
+        if match is None:
+            return len(text)
+        position = match.start()
+        self._container = text[position] if text[position] in "[{" else ""
+        return position + 1 if self._container else position
+
+    def _skip_string(self, text: str, position: int) -> int:
+        """Return the position after the string content starting at position."""
+        if self._escaped:
+            self._escaped = False
+            return position + 1
+        match = STRING_SPECIAL_PATTERN.search(text, position)
+        if match is None:
+            return len(text)
+        if match.group() == "\\":
+            self._escaped = True
+        else:
+            self._in_string = False
+        return match.end()
+
+    def _append(self, text: str) -> None:
+        """Add text to the element currently being received."""
+        if not text:
+            return
+        self._size += len(text)
+        if self._max_element_size is not None and self._size > self._max_element_size:
+            raise ValueError(
+                f"PyON element exceeds the limit of {self._max_element_size} characters"
+            )
+        self._parts.append(text)
 
-    return json.loads(message)
+    def _emit(self, elements: List[Any]) -> None:
+        """Decode the completed element and add it to elements."""
+        text = convert_pyon_booleans("".join(self._parts).strip())
+        self._parts, self._size = [], 0
+        if not text:
+            return
+        if self._container == "[":
+            elements.append(json.loads(text))
+            return
+        key, position = self._decoder.raw_decode(text)
+        separator = SEPARATOR_PATTERN.match(text, position)
+        if separator is None:
+            raise json.JSONDecodeError("Expecting ':'", text, position)
+        elements.append((key, json.loads(text[separator.end() :])))
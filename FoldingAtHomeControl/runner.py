@@ -0,0 +1,142 @@
+"""Run a fleet on a background thread for synchronous applications."""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from .fleet import SHUTDOWN_TIMEOUT_IN_SECONDS, FoldingAtHomeFleet
+from .foldingathomecontrol import FoldingAtHomeController
+from .snapshot import Snapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BackgroundRunner:
+    """Keep a fleet connected on a dedicated event loop thread.
+
+    Every received message is published into a per-controller dict which is
+    replaced, never mutated, so other threads read the latest state without
+    locking. Commands are submitted to the event loop and return thread-safe
+    futures.
+    """
+
+    def __init__(self, fleet: FoldingAtHomeFleet) -> None:
+        """Initialize the runner."""
+        self._fleet: FoldingAtHomeFleet = fleet
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_future: Optional[concurrent.futures.Future] = None
+        self._remove_callbacks: Dict[str, Callable] = {}
+        self._states: Dict[str, Dict[str, Tuple[float, Any]]] = {}
+
+    def start(self) -> None:
+        """Start the event loop thread and connect the fleet."""
+        if self._thread is not None:
+            return
+        for name, controller in self._fleet.controllers.items():
+            self._states[name] = controller.snapshot()
+            self._remove_callbacks[name] = controller.register_callback(
+                self._create_callback(name, controller)
+            )
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        self._thread = threading.Thread(
+            target=self._run_loop, name="FoldingAtHomeRunner", daemon=True
+        )
+        self._thread.start()
+        self._start_future = asyncio.run_coroutine_threadsafe(self._fleet.start(), loop)
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT_IN_SECONDS) -> None:
+        """Close the fleet and stop the event loop thread."""
+        if self._loop is None or self._thread is None:
+            return
+        try:
+            self.run(self._fleet.close_async(timeout), timeout * 2)
+        except (concurrent.futures.TimeoutError, asyncio.TimeoutError):
+            _LOGGER.warning("Fleet did not close within %s seconds", timeout)
+        if self._start_future is not None:
+            self._start_future.cancel()
+            self._start_future = None
+        for remove_callback in self._remove_callbacks.values():
+            remove_callback()
+        self._remove_callbacks.clear()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._loop = None
+
+    def submit(self, coroutine: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        """Schedule a coroutine on the event loop thread."""
+        if self._loop is None:
+            raise RuntimeError("The runner is not started")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)  # type: ignore
+
+    def run(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the event loop thread and wait for its result."""
+        return self.submit(coroutine).result(timeout)
+
+    def get_latest_message(self, name: str, message_type: str) -> Any:
+        """Return the latest message of a type received by a controller."""
+        entry = self._states.get(name, {}).get(message_type)
+        return None if entry is None else entry[1]
+
+    def get_message_received_at(self, name: str, message_type: str) -> Optional[float]:
+        """Return when the latest message of a type was received."""
+        entry = self._states.get(name, {}).get(message_type)
+        return None if entry is None else entry[0]
+
+    def snapshot(self) -> Snapshot:
+        """Return the latest messages of all controllers by name."""
+        return dict(self._states)
+
+    def _create_callback(
+        self, name: str, controller: FoldingAtHomeController
+    ) -> Callable:
+        """Create the callback publishing the messages of a controller."""
+
+        def callback(message_type: str, message: Any) -> None:
+            """Publish a copy of the state including the new message."""
+            received_at = controller.get_message_received_at(message_type)
+            state = dict(self._states.get(name, {}))
+            state[message_type] = (received_at or time.time(), message)
+            self._states[name] = state
+
+        return callback
+
+    def _run_loop(self) -> None:
+        """Run the event loop until it is stopped."""
+        loop = self._loop
+        assert loop is not None
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def __enter__(self) -> "BackgroundRunner":
+        """Start the runner."""
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop the runner."""
+        self.stop()
+
+    @property
+    def fleet(self) -> FoldingAtHomeFleet:
+        """The fleet run by this runner."""
+        return self._fleet
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the event loop thread is running."""
+        return self._thread is not None and self._thread.is_alive()
@@ -1,22 +1,24 @@
 """Serial Connection for FoldingAtHomeControl."""
 import asyncio
 import logging
-from asyncio import Future, Lock, StreamReader, StreamWriter
+from asyncio import Future, LimitOverrunError, Lock, StreamReader, StreamWriter
 
 try:
     from asyncio.streams import IncompleteReadError  # type: ignore
 except ImportError:
     from asyncio import IncompleteReadError  # type: ignore
-from typing import Any, Optional
+from typing import AsyncIterator, Optional
 
 from .exceptions import (
     FoldingAtHomeControlAuthenticationFailed,
     FoldingAtHomeControlConnectionFailed,
+    FoldingAtHomeControlReadTimeout,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 MAX_AUTHENTICATION_MESSAGE_COUNT = 5
+BUFFER_LIMIT_IN_BYTES = 2**16
 
 
 class SerialConnection:
@@ -27,27 +29,45 @@ class SerialConnection:
         address: str,
         port: int = 36330,
         password: Optional[str] = None,
-        read_timeout: int = 5,
+        read_timeout: float = 5,
+        buffer_limit: int = BUFFER_LIMIT_IN_BYTES,
     ) -> None:
         """Initialize connection data."""
         self._address: str = address
         self._port: int = port
         self._password: Optional[str] = password
-        self._read_timeout: int = read_timeout
+        self._read_timeout: float = read_timeout
+        self._buffer_limit: int = buffer_limit
 
         self._reader: StreamReader
         self._writer: StreamWriter
         self._callbacks: dict = {}
         self._is_connected: bool = False
         self._is_authenticated: bool = False
-        self._reader_lock: Lock = Lock()
-        self._writer_lock: Lock = Lock()
+        self._welcome_message: bytes = b""
+        # Created on first use, so they bind to the loop running the connection
+        self._reader_lock_instance: Optional[Lock] = None
+        self._writer_lock_instance: Optional[Lock] = None
         self._read_future: Optional[Future] = None
 
+    @property
+    def _reader_lock(self) -> Lock:
+        """The lock serializing reads, created inside the running loop."""
+        if self._reader_lock_instance is None:
+            self._reader_lock_instance = Lock()
+        return self._reader_lock_instance
+
+    @property
+    def _writer_lock(self) -> Lock:
+        """The lock serializing writes, created inside the running loop."""
+        if self._writer_lock_instance is None:
+            self._writer_lock_instance = Lock()
+        return self._writer_lock_instance
+
     async def connect_async(self) -> None:
         """Open the connection to the socket."""
         self._reader, self._writer = await asyncio.open_connection(
-            self._address, self._port
+            self._address, self._port, limit=self._buffer_limit
         )
         await self._receive_welcome_message_async()
         if self._password is not None:
@@ -56,12 +76,15 @@ class SerialConnection:
 
     async def _receive_welcome_message_async(self) -> None:
         """Convenience method to receive strip and log the welcome message."""
-        welcome_message = await self.read_async()
+        welcome_message = await self.read_line_async()
         # Strip clearscreen: \x1b[H\x1b[2J
         welcome_message = welcome_message[7:]
         # Strip linebreaks
         welcome_message = welcome_message.strip()
-        _LOGGER.debug("Received welcome message: %s", welcome_message)
+        self._welcome_message = welcome_message
+        _LOGGER.debug(
+            "Received welcome message: %s", welcome_message.decode(errors="replace")
+        )
 
     async def _authenticate_async(self) -> None:
         """Use the provided password to authenticate."""
@@ -71,16 +94,16 @@ class SerialConnection:
 
     async def _wait_for_auth_response_async(self) -> None:
         """Wait until a valid auth response is received."""
-        auth_response = ""
+        auth_response = b""
         for _ in range(MAX_AUTHENTICATION_MESSAGE_COUNT):
-            if "OK" in auth_response:
+            if b"OK" in auth_response:
                 self._is_authenticated = True
                 _LOGGER.debug("Authentication response: %s", auth_response)
                 return
-            if "FAILED" in auth_response:
+            if b"FAILED" in auth_response:
                 _LOGGER.debug("Authentication response: %s", auth_response)
                 raise FoldingAtHomeControlAuthenticationFailed("Password is incorrect.")
-            auth_response = await self.read_async()
+            auth_response = await self.read_line_async()
         _LOGGER.debug(
             "Did not receive a valid authentication response in the last %d messages.",
             MAX_AUTHENTICATION_MESSAGE_COUNT,
@@ -89,39 +112,83 @@ class SerialConnection:
             "Did not receive a valid authentication response."
         )
 
-    def set_read_timeout(self, timeout: int) -> None:
+    def set_read_timeout(self, timeout: float) -> None:
         """Set the read timeout in seconds."""
         self._read_timeout = timeout
 
-    async def read_async(self) -> Any:
-        """Read string from the socket and return it."""
+    async def read_async(
+        self, timeout: Optional[float] = None, disconnect_on_timeout: bool = True
+    ) -> str:
+        """Read a line from the socket and return it decoded."""
+        line = await self.read_line_async(timeout, disconnect_on_timeout)
+        return line.decode(errors="replace")
+
+    async def read_line_async(
+        self, timeout: Optional[float] = None, disconnect_on_timeout: bool = True
+    ) -> bytes:
+        """Read a line from the socket and return it undecoded.
+
+        Waits at most timeout seconds, defaulting to the read timeout. Unless
+        disconnect_on_timeout is False a timeout marks the connection as dead.
+        """
         async with self._reader_lock:
-            try:
-                self._read_future = asyncio.ensure_future(self._reader.readuntil())
-                completed, pending = await asyncio.wait(
-                    [self._read_future], timeout=self._read_timeout
+            return await self._read_until_async(b"\n", timeout, disconnect_on_timeout)
+
+    async def read_chunks_async(self, separator: bytes) -> AsyncIterator[bytes]:
+        """Yield the data up to and including separator in bounded chunks.
+
+        Chunks are at most about the buffer limit in size, so arbitrarily
+        large messages can be consumed without holding them in memory.
+        """
+        async with self._reader_lock:
+            while True:
+                try:
+                    yield await self._read_until_async(separator)
+                    return
+                except LimitOverrunError as error:
+                    yield await self._reader.readexactly(error.consumed)
+
+    async def _read_until_async(
+        self,
+        separator: bytes,
+        timeout: Optional[float] = None,
+        disconnect_on_timeout: bool = True,
+    ) -> bytes:
+        """Read up to and including separator with a timeout."""
+        if timeout is None:
+            timeout = self._read_timeout
+        try:
+            self._read_future = asyncio.ensure_future(self._reader.readuntil(separator))
+            completed, pending = await asyncio.wait(
+                [self._read_future], timeout=timeout
+            )
+            if self._read_future in pending:
+                try:
+                    self._read_future.cancel()
+                    await self._read_future
+                except asyncio.CancelledError:
+                    pass
+                if not disconnect_on_timeout:
+                    raise FoldingAtHomeControlReadTimeout
+                _LOGGER.error(
+                    "Timeout while trying to read from %s:%d",
+                    self.address,
+                    self.port,
                 )
-                if self._read_future in pending:
-                    try:
-                        self._read_future.cancel()
-                        await self._read_future
-                    except asyncio.CancelledError:
-                        pass
-                    _LOGGER.error(
-                        "Timeout while trying to read from %s:%d",
-                        self.address,
-                        self.port,
-                    )
-                    self._is_connected = False
-                    raise FoldingAtHomeControlConnectionFailed
-                _LOGGER.debug("Gathering %i completed read results", len(completed))
-                future_results = await asyncio.gather(*completed)
-                _LOGGER.debug("Gathering %i pending read results", len(pending))
-                await asyncio.gather(*pending)
-            except IncompleteReadError as error:
                 self._is_connected = False
-                raise error
-            return future_results[0].decode()
+                raise FoldingAtHomeControlReadTimeout
+            if self._read_future.cancelled():
+                # Cancelled by cleanup_async, not by the caller
+                raise FoldingAtHomeControlConnectionFailed("Connection was closed")
+            _LOGGER.debug("Gathering %i completed read results", len(completed))
+            future_results = await asyncio.gather(*completed)
+            _LOGGER.debug("Gathering %i pending read results", len(pending))
+            await asyncio.gather(*pending)
+        except IncompleteReadError as error:
+            self._is_connected = False
+            raise error
+        data: bytes = future_results[0]
+        return data
 
     async def send_async(self, message: str) -> None:
         """Send data."""
@@ -129,19 +196,45 @@ class SerialConnection:
             self._writer.write(message.encode())
             await self._writer.drain()
 
-    async def cleanup_async(self) -> None:
-        """Clean up running tasks and writers."""
+    async def probe_async(self, command: str) -> None:
+        """Send a probe command, marking the connection as dead if that fails."""
+        try:
+            await self.send_async(f"{command}\n")
+        except OSError as error:
+            self._is_connected = False
+            raise FoldingAtHomeControlConnectionFailed from error
+
+    async def cleanup_async(self, timeout: Optional[float] = None) -> bool:
+        """Clean up running tasks and writers.
+
+        A writer which does not drain and close within timeout seconds is
+        aborted. Returns whether the connection was closed cleanly.
+        """
+        self._is_connected = False
         if self._read_future is not None:
             try:
                 self._read_future.cancel()
                 await self._read_future
             except (asyncio.CancelledError, IncompleteReadError):
                 pass
+        closed_cleanly = True
         if hasattr(self, "_writer"):
-            await self._writer.drain()
-            self._writer.close()
-            await self._writer.wait_closed()
+            try:
+                await asyncio.wait_for(self._close_writer_async(), timeout)
+            except (asyncio.TimeoutError, OSError) as error:
+                _LOGGER.debug(
+                    "Aborting connection to %s:%d: %r", self.address, self.port, error
+                )
+                self._writer.transport.abort()
+                closed_cleanly = False
         _LOGGER.info("Cleanup finished")
+        return closed_cleanly
+
+    async def _close_writer_async(self) -> None:
+        """Flush and close the writer."""
+        await self._writer.drain()
+        self._writer.close()
+        await self._writer.wait_closed()
 
     @property
     def address(self) -> str:
@@ -164,6 +257,16 @@ class SerialConnection:
         return self._is_authenticated
 
     @property
-    def read_timeout(self) -> int:
+    def buffer_limit(self) -> int:
+        """The size of the read buffer in bytes."""
+        return self._buffer_limit
+
+    @property
+    def welcome_message(self) -> bytes:
+        """The welcome message received when connecting."""
+        return self._welcome_message
+
+    @property
+    def read_timeout(self) -> float:
         """The configured read timeout."""
         return self._read_timeout
@@ -0,0 +1,110 @@
+"""Persist the latest messages of controllers for fast restarts."""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, List, Mapping, Tuple
+
+from .foldingathomecontrol import FoldingAtHomeController
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_INTERVAL_IN_SECONDS = 60
+COMPRESS_LEVEL = 1
+
+Snapshot = Dict[str, Dict[str, Tuple[float, Any]]]
+
+
+def take_snapshot(controllers: Mapping[str, FoldingAtHomeController]) -> Snapshot:
+    """Collect the latest messages of all controllers by name."""
+    return {name: controller.snapshot() for name, controller in controllers.items()}
+
+
+def write_snapshot(path: str, snapshot: Snapshot) -> None:
+    """Atomically write a snapshot as gzipped JSON."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as raw_file:
+        with gzip.open(raw_file, "wt", compresslevel=COMPRESS_LEVEL) as file:
+            json.dump(
+                {"version": SNAPSHOT_VERSION, "controllers": snapshot},
+                file,
+                separators=(",", ":"),
+            )
+        # Make sure the data is on disk before it replaces the old snapshot
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """Read a snapshot written by write_snapshot."""
+    with gzip.open(path, "rt") as file:
+        content = json.load(file)
+    version = content.get("version") if isinstance(content, dict) else None
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    try:
+        return {
+            name: {
+                message_type: (received_at, message)
+                for message_type, (received_at, message) in messages.items()
+            }
+            for name, messages in content["controllers"].items()
+        }
+    except (AttributeError, KeyError, TypeError) as error:
+        raise ValueError(f"Malformed snapshot: {error!r}") from error
+
+
+def save_snapshot(
+    path: str, controllers: Mapping[str, FoldingAtHomeController]
+) -> None:
+    """Write the latest messages of all controllers to path."""
+    write_snapshot(path, take_snapshot(controllers))
+
+
+def load_snapshot(
+    path: str, controllers: Mapping[str, FoldingAtHomeController]
+) -> List[str]:
+    """Restore the messages in the snapshot at path into the controllers.
+
+    Restored messages are marked as stale until a live message of the same
+    type arrives. Returns the names of the restored controllers; a missing,
+    corrupt or outdated snapshot file restores nothing.
+    """
+    try:
+        snapshot = read_snapshot(path)
+    except FileNotFoundError:
+        _LOGGER.debug("No snapshot found at %s", path)
+        return []
+    except (OSError, EOFError, ValueError) as error:
+        _LOGGER.warning("Ignoring unreadable snapshot %s: %s", path, error)
+        return []
+    restored = []
+    for name, messages in snapshot.items():
+        if name in controllers:
+            controllers[name].restore_snapshot(messages)
+            restored.append(name)
+    return restored
+
+
+async def persist_snapshots_async(
+    path: str,
+    controllers: Mapping[str, FoldingAtHomeController],
+    interval: float = SNAPSHOT_INTERVAL_IN_SECONDS,
+) -> None:
+    """Periodically save snapshots until cancelled.
+
+    The snapshot is collected on the event loop, but serializing and writing
+    it happens in the default executor so the socket reads are not blocked.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(
+                None, write_snapshot, path, take_snapshot(controllers)
+            )
+        except OSError as error:
+            _LOGGER.error("Could not write snapshot to %s: %s", path, error)
@@ -0,0 +1,222 @@
+"""Index the work units of many clients."""
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from .const import PyOnMessageTypes
+from .foldingathomecontrol import FoldingAtHomeController
+
+UnitKey = Tuple[str, str]
+ProjectRunCloneGen = Tuple[int, int, int, int]
+
+
+@dataclass
+class IndexedUnit:
+    """A work unit of a client together with its index keys."""
+
+    host: str
+    queue_id: str
+    unit_id: str
+    project_run_clone_gen: ProjectRunCloneGen
+    state: str
+    core: str
+    state_since: float
+    unit: dict
+
+    @property
+    def key(self) -> UnitKey:
+        """The host and queue id identifying the unit."""
+        return (self.host, self.queue_id)
+
+    @property
+    def project(self) -> int:
+        """The project of the unit."""
+        return self.project_run_clone_gen[0]
+
+
+class UnitIndex:
+    """Index the units of all hosts as their queue-info messages arrive.
+
+    Each unit is filed under its unit id, its project/run/clone/gen, its
+    project, its state and its core. Units whose keys did not change are not
+    touched, a changed or removed unit only moves between the sets it belongs
+    to, so lookups never scan the units of every host.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty indexes."""
+        self._units: Dict[UnitKey, IndexedUnit] = {}
+        self._host_keys: Dict[str, Set[UnitKey]] = {}
+        self._by_unit_id: Dict[str, Set[UnitKey]] = {}
+        self._by_project_run_clone_gen: Dict[ProjectRunCloneGen, Set[UnitKey]] = {}
+        self._by_project: Dict[int, Set[UnitKey]] = {}
+        self._by_state: Dict[str, Set[UnitKey]] = {}
+        self._by_core: Dict[str, Set[UnitKey]] = {}
+
+    def attach(self, name: str, controller: FoldingAtHomeController) -> Callable:
+        """Index the units reported by a controller."""
+
+        def callback(message_type: str, message: Any) -> None:
+            """Pass unit messages on to the index."""
+            if message_type == PyOnMessageTypes.UNITS.value:
+                self.update_units(name, message)
+
+        return controller.register_callback(callback)
+
+    def update_units(
+        self, host: str, units: Iterable[dict], received_at: Optional[float] = None
+    ) -> None:
+        """Replace the units of a host with the units of a queue-info message."""
+        if received_at is None:
+            received_at = time.time()
+        keys = set()
+        for unit in units:
+            key = (host, str(unit.get("id")))
+            keys.add(key)
+            self._update_unit(key, unit, received_at)
+        for key in self._host_keys.get(host, set()) - keys:
+            self._remove_unit(key)
+        self._host_keys[host] = keys
+
+    def remove_host(self, host: str) -> None:
+        """Forget all units of a host."""
+        for key in self._host_keys.pop(host, set()):
+            self._remove_unit(key)
+
+    def get_unit(self, unit_id: str) -> Optional[IndexedUnit]:
+        """Return the unit with a unit id like '0x0000...d4ea'."""
+        keys = self._by_unit_id.get(unit_id.lower())
+        return self._units[next(iter(keys))] if keys else None
+
+    def find_by_project_run_clone_gen(
+        self, project: int, run: int, clone: int, gen: int
+    ) -> List[IndexedUnit]:
+        """Return the units of a project/run/clone/gen."""
+        return self._lookup(self._by_project_run_clone_gen, (project, run, clone, gen))
+
+    def find_by_project(self, project: int) -> List[IndexedUnit]:
+        """Return the units of a project."""
+        return self._lookup(self._by_project, project)
+
+    def find_by_state(
+        self, state: str, min_duration: float = 0, now: Optional[float] = None
+    ) -> List[IndexedUnit]:
+        """Return the units which are in a state for at least min_duration."""
+        units = self._lookup(self._by_state, state.upper())
+        if min_duration <= 0:
+            return units
+        if now is None:
+            now = time.time()
+        return [unit for unit in units if now - unit.state_since >= min_duration]
+
+    def find_by_core(self, core: str) -> List[IndexedUnit]:
+        """Return the units running on a core like '0xa8'."""
+        return self._lookup(self._by_core, core.lower())
+
+    def get_hosts_by_project(self, project: int) -> Set[str]:
+        """Return the hosts working on a project."""
+        return {host for host, _ in self._by_project.get(project, ())}
+
+    def _lookup(self, index: Dict[Any, Set[UnitKey]], value: Any) -> List[IndexedUnit]:
+        """Return the units filed under a value of an index."""
+        return [self._units[key] for key in index.get(value, ())]
+
+    def _update_unit(self, key: UnitKey, unit: dict, received_at: float) -> None:
+        """Add a unit or move it to the sets matching its new keys."""
+        unit_id = str(unit.get("unit", "")).lower()
+        project_run_clone_gen = (
+            _parse_int(unit.get("project")),
+            _parse_int(unit.get("run")),
+            _parse_int(unit.get("clone")),
+            _parse_int(unit.get("gen")),
+        )
+        state = str(unit.get("state", "")).upper()
+        core = str(unit.get("core", "")).lower()
+
+        indexed = self._units.get(key)
+        if indexed is None:
+            indexed = IndexedUnit(
+                key[0],
+                key[1],
+                unit_id,
+                project_run_clone_gen,
+                state,
+                core,
+                received_at,
+                unit,
+            )
+            self._units[key] = indexed
+            _add(self._by_unit_id, unit_id, key)
+            _add(self._by_project_run_clone_gen, project_run_clone_gen, key)
+            _add(self._by_project, project_run_clone_gen[0], key)
+            _add(self._by_state, state, key)
+            _add(self._by_core, core, key)
+            return
+
+        indexed.unit = unit
+        if unit_id != indexed.unit_id:
+            _move(self._by_unit_id, indexed.unit_id, unit_id, key)
+            indexed.unit_id = unit_id
+            # A new unit in the same queue slot starts its state afresh
+            indexed.state_since = received_at
+        if project_run_clone_gen != indexed.project_run_clone_gen:
+            _move(
+                self._by_project_run_clone_gen,
+                indexed.project_run_clone_gen,
+                project_run_clone_gen,
+                key,
+            )
+            _move(self._by_project, indexed.project, project_run_clone_gen[0], key)
+            indexed.project_run_clone_gen = project_run_clone_gen
+        if state != indexed.state:
+            _move(self._by_state, indexed.state, state, key)
+            indexed.state = state
+            indexed.state_since = received_at
+        if core != indexed.core:
+            _move(self._by_core, indexed.core, core, key)
+            indexed.core = core
+
+    def _remove_unit(self, key: UnitKey) -> None:
+        """Remove a unit from all indexes."""
+        indexed = self._units.pop(key, None)
+        if indexed is None:
+            return
+        _discard(self._by_unit_id, indexed.unit_id, key)
+        _discard(self._by_project_run_clone_gen, indexed.project_run_clone_gen, key)
+        _discard(self._by_project, indexed.project, key)
+        _discard(self._by_state, indexed.state, key)
+        _discard(self._by_core, indexed.core, key)
+
+    def __len__(self) -> int:
+        """The number of indexed units."""
+        return len(self._units)
+
+
+def _parse_int(value: Any) -> int:
+    """Parse a project, run, clone or gen number, -1 if it is missing."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _add(index: Dict[Any, Set[UnitKey]], value: Hashable, key: UnitKey) -> None:
+    """File a unit under a value."""
+    index.setdefault(value, set()).add(key)
+
+
+def _discard(index: Dict[Any, Set[UnitKey]], value: Hashable, key: UnitKey) -> None:
+    """Remove a unit from a value, dropping values without units."""
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+
+def _move(
+    index: Dict[Any, Set[UnitKey]], old: Hashable, new: Hashable, key: UnitKey
+) -> None:
+    """Move a unit from one value to another."""
+    _discard(index, old, key)
+    _add(index, new, key)
@@ -0,0 +1,79 @@
+"""Benchmark FleetForecast at fleet scale.
+
+Run from the repository root with ``python benchmarks/forecast.py``.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from FoldingAtHomeControl.forecast import (  # noqa: E402
+    FleetForecast,
+    parse_interval,
+    parse_number,
+)
+
+
+def create_units(host: int, units_per_host: int, percent_done: float) -> list:
+    """Create the units of a queue-info message of a host."""
+    return [
+        {
+            "id": f"{unit:02d}",
+            "unit": f"0x{host:08x}{unit:02d}",
+            "percentdone": f"{percent_done + unit:.2f}%",
+            "eta": "1 hours 04 mins",
+            "timeremaining": "2.50 days",
+            "ppd": "240000",
+            "creditestimate": "9000",
+        }
+        for unit in range(units_per_host)
+    ]
+
+
+def main() -> None:
+    """Time updates and forecasts against re-parsing every unit."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=10000)
+    parser.add_argument("--units", type=int, default=5)
+    args = parser.parse_args()
+
+    first = {host: create_units(host, args.units, 10) for host in range(args.hosts)}
+    second = {host: create_units(host, args.units, 12) for host in range(args.hosts)}
+    forecast = FleetForecast()
+
+    started = time.perf_counter()
+    for host, units in first.items():
+        forecast.update_units(str(host), units, received_at=0)
+    for host, units in second.items():
+        forecast.update_units(str(host), units, received_at=60)
+    updated = time.perf_counter()
+    result = forecast.forecast()
+    forecasted = time.perf_counter()
+    reparsed = [
+        (
+            parse_number(unit["ppd"]) / 24,
+            60 + parse_interval(unit["eta"]),
+            60 + parse_interval(unit["timeremaining"]),
+        )
+        for units in second.values()
+        for unit in units
+    ]
+    finished = time.perf_counter()
+
+    print(f"units:                 {len(result.keys)}")
+    print(
+        "update per message:    "
+        f"{(updated - started) / (2 * args.hosts) * 1e6:.1f} us"
+    )
+    print(f"forecast:              {(forecasted - updated) * 1e3:.1f} ms")
+    print(
+        f"re-parse all units:    {(finished - forecasted) * 1e3:.1f} ms"
+        f" ({len(reparsed)} units)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 """Fixtures for tests."""
 import asyncio
+import json
 from asyncio.streams import StreamReader
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -15,7 +18,142 @@ except ImportError:
 
     MagicMock.__await__ = lambda _: async_magic().__await__()
 from FoldingAtHomeControl import FoldingAtHomeController
-from FoldingAtHomeControl.serialconnection import SerialConnection
+from FoldingAtHomeControl.serialconnection import (
+    BUFFER_LIMIT_IN_BYTES,
+    SerialConnection,
+)
+
+WELCOME_MESSAGE = b"\x1b[H\x1b[2JWelcome to the Folding@home Client command server.\n"
+
+Responder = Callable[[str], Optional[Iterable[Tuple[str, Any]]]]
+
+
+def format_pyon_message(message_type: str, message: Any) -> bytes:
+    """Format a message the way the client sends it."""
+    return f"PyON 1 {message_type}\n{json.dumps(message)}\n---\n".encode()
+
+
+class FakeClient:
+    """A Folding@home client talking to a real controller.
+
+    The controller connects through the patched asyncio.open_connection and
+    reads every message through its regular read path. Commands it writes are
+    recorded in sent_commands and passed line by line to the responder, whose
+    (message_type, message) answers are sent back to the controller.
+    """
+
+    def __init__(
+        self, address: str, responder: Optional[Responder] = None, **kwargs: Any
+    ) -> None:
+        """Initialize the client and its controller."""
+        self.controller = FoldingAtHomeController(address, **kwargs)
+        self.responder = responder
+        self.sent_commands: List[str] = []
+        self.hanging: bool = False
+        self._reader: Optional[StreamReader] = None
+        self._backlog: List[Optional[bytes]] = []
+        self._task: Optional[asyncio.Future] = None
+
+    async def open_connection_async(
+        self, limit: int = BUFFER_LIMIT_IN_BYTES
+    ) -> Tuple[StreamReader, Mock]:
+        """Accept a connection, sending the welcome and all queued data."""
+        self._reader = StreamReader(limit=limit)
+        self._reader.feed_data(WELCOME_MESSAGE)
+        for data in self._backlog:
+            self._feed(data)
+        self._backlog.clear()
+        writer = MagicMock()
+        writer.write = Mock(side_effect=self._receive)
+        writer.close = Mock()
+        writer.wait_closed = self._wait_closed_async
+        writer.transport = Mock()
+        return self._reader, writer
+
+    def send(self, data: bytes) -> None:
+        """Send raw data, queueing it until the controller connected."""
+        if self._reader is None:
+            self._backlog.append(data)
+        else:
+            self._feed(data)
+
+    def send_message(self, message_type: str, message: Any) -> None:
+        """Send a PyON message."""
+        self.send(format_pyon_message(message_type, message))
+
+    def close_connection(self) -> None:
+        """Close the connection from the client side."""
+        if self._reader is None:
+            self._backlog.append(None)
+        else:
+            self._feed(None)
+
+    async def start_async(self) -> None:
+        """Connect the controller and let it read messages in the background."""
+        await self.controller.try_connect_async(timeout=5)
+        self._task = asyncio.ensure_future(
+            self.controller.start(connect=False, subscribe=False)
+        )
+
+    async def deliver_async(self, message_type: str, message: Any) -> Any:
+        """Send a message and wait until the controller passed it on."""
+        received = self.controller.expect_message(message_type, lambda _: True)
+        self.send_message(message_type, message)
+        return await asyncio.wait_for(received, 5)
+
+    async def close_async(self) -> None:
+        """Close the controller and wait until it stopped reading."""
+        await self.controller.close_async(timeout=1)
+        if self._task is not None:
+            await asyncio.wait_for(self._task, 5)
+            self._task = None
+
+    def _feed(self, data: Optional[bytes]) -> None:
+        """Pass data or the end of the stream to the reader."""
+        assert self._reader is not None
+        if data is None:
+            self._reader.feed_eof()
+        else:
+            self._reader.feed_data(data)
+
+    def _receive(self, data: bytes) -> None:
+        """Record written commands and send the answers of the responder."""
+        command = data.decode().rstrip("\n")
+        self.sent_commands.append(command)
+        if self.responder is None:
+            return
+        for line in command.split("\n"):
+            for message_type, message in self.responder(line) or ():
+                self.send_message(message_type, message)
+
+    async def _wait_closed_async(self) -> None:
+        """Close the connection, never finishing if the client hangs."""
+        if self.hanging:
+            await asyncio.sleep(3600)
+
+
+@pytest.fixture(name="create_fake_client")
+def fixture_create_fake_client():
+    """Return a factory of FakeClients reachable through open_connection."""
+    clients = {}
+    open_connection = asyncio.open_connection
+
+    async def open_fake_connection(host=None, port=None, **kwargs):
+        if host not in clients:
+            return await open_connection(host, port, **kwargs)
+        return await clients[host].open_connection_async(
+            kwargs.get("limit", BUFFER_LIMIT_IN_BYTES)
+        )
+
+    def create_fake_client(
+        responder: Optional[Responder] = None, **kwargs: Any
+    ) -> FakeClient:
+        address = f"fake{len(clients)}"
+        clients[address] = FakeClient(address, responder, **kwargs)
+        return clients[address]
+
+    with patch("asyncio.open_connection", new=open_fake_connection):
+        yield create_fake_client
 
 
 @pytest.fixture
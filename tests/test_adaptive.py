@@ -0,0 +1,91 @@
+"""Tests for adaptive"""
+import pytest
+
+from FoldingAtHomeControl import AdaptiveUpdateRate
+
+OPTIONS = {"power": "FULL"}
+
+
+def create_units(percent_done, state="RUNNING", eta="2.50 days"):
+    """Create a units message with a single unit."""
+    return [
+        {
+            "id": "00",
+            "unit": "0x1",
+            "state": state,
+            "percentdone": percent_done,
+            "eta": eta,
+        }
+    ]
+
+
+def test_stable_data_backs_off():
+    """Test that unchanged data doubles the rate up to the maximum."""
+    adaptive = AdaptiveUpdateRate(min_rate=2, max_rate=10)
+    rates = [adaptive.observe("host1", "options", OPTIONS) for _ in range(5)]
+    assert rates == [2, 4, 8, 10, 10]
+    assert adaptive.observe("host1", "options", {"power": "LIGHT"}) == 2
+    assert adaptive.get_update_rate("host1", "options") == 2
+    assert adaptive.get_update_rate("host2", "options") is None
+
+
+def test_unit_progress_is_stable_until_near_completion():
+    """Test that progress alone backs off but finishing units speed up."""
+    adaptive = AdaptiveUpdateRate(min_rate=1, max_rate=60)
+    assert adaptive.observe("host1", "units", create_units("10.00%")) == 1
+    assert adaptive.observe("host1", "units", create_units("20.00%")) == 2
+    assert adaptive.observe("host1", "units", create_units("30.00%")) == 4
+    assert adaptive.observe("host1", "units", create_units("96.00%")) == 1
+    assert adaptive.observe("host1", "units", create_units("0%", "READY")) == 1
+
+
+def test_stalled_units_near_completion_back_off():
+    """Test that only running units near completion keep the minimum rate."""
+    adaptive = AdaptiveUpdateRate(max_rate=60)
+    for state in ("PAUSED", "SEND"):
+        rates = [
+            adaptive.observe(state, "units", create_units("99.00%", state))
+            for _ in range(3)
+        ]
+        assert rates == [5, 10, 20]
+
+
+def test_running_unit_eta_caps_the_rate():
+    """Test that the rate stays below half the eta of running units."""
+    adaptive = AdaptiveUpdateRate(max_rate=300)
+    rates = [
+        adaptive.observe("host1", "units", create_units("50.00%", eta="2 mins"))
+        for _ in range(6)
+    ]
+    assert rates == [5, 10, 20, 40, 60, 60]
+    units = create_units("50.00%", eta="20 secs")
+    assert adaptive.observe("host1", "units", units) == 10
+    paused = create_units("50.00%", "PAUSED", eta="2 mins")
+    rates = [adaptive.observe("host2", "units", paused) for _ in range(4)]
+    assert rates == [5, 10, 20, 40]
+
+
+@pytest.mark.asyncio
+async def test_attach_changes_subscription_rates(create_fake_client):
+    """Test that rate changes are sent for subscribed commands only."""
+    client = create_fake_client(update_rate=1)
+    await client.start_async()
+    await client.controller.subscribe_async(["options", "heartbeat"])
+    client.sent_commands.clear()
+    adaptive = AdaptiveUpdateRate(min_rate=1, max_rate=60)
+    detach = adaptive.attach("host1", client.controller)
+    for _ in range(3):
+        await client.deliver_async("options", OPTIONS)
+    await client.deliver_async("heartbeat", 1)
+    await client.deliver_async("slots", [])
+    assert client.sent_commands == [
+        "updates add 0 2 $options",
+        "updates add 0 4 $options",
+    ]
+    assert client.controller.subscriptions == {"options": 4, "heartbeat": 1}
+
+    detach()
+    assert adaptive.get_update_rate("host1", "options") is None
+    await client.deliver_async("options", OPTIONS)
+    assert len(client.sent_commands) == 2
+    await client.close_async()
@@ -0,0 +1,73 @@
+"""Tests for discovery"""
+import asyncio
+import json
+
+import pytest
+
+from FoldingAtHomeControl import DiscoveredClient, create_fleet, discover_async
+from FoldingAtHomeControl.discovery import iterate_addresses, main
+
+WELCOME = b"\x1b[H\x1b[2JWelcome to the Folding@home Client command server.\n"
+
+
+async def start_server(welcome, requires_auth=False):
+    """Start a local server answering like a client."""
+
+    async def handle(reader, writer):
+        writer.write(welcome)
+        try:
+            await reader.readuntil(b"\n")
+            if requires_auth:
+                writer.write(b"ERROR: unknown command or variable 'updates'\n")
+            else:
+                writer.write(b"PyON 1 heartbeat\n0\n---\n")
+            await writer.drain()
+            await reader.read()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_iterate_addresses():
+    """Test that networks are expanded to their host addresses."""
+    assert list(iterate_addresses(["192.168.0.0/30", "10.0.0.1"])) == [
+        "192.168.0.1",
+        "192.168.0.2",
+        "10.0.0.1",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("requires_auth", [True, False])
+async def test_discover_client(requires_auth):
+    """Test that a client is discovered and its auth requirement detected."""
+    server, port = await start_server(WELCOME, requires_auth)
+    async with server:
+        clients = await discover_async(
+            ["127.0.0.0/30"], port, timeout=1, check_authentication=True
+        )
+    assert clients == [DiscoveredClient("127.0.0.1", port, requires_auth)]
+
+
+@pytest.mark.asyncio
+async def test_discover_ignores_other_services():
+    """Test that services without the client banner are not reported."""
+    server, port = await start_server(b"SSH-2.0-OpenSSH_9.0\n")
+    async with server:
+        assert await discover_async(["127.0.0.1"], port, timeout=1) == []
+
+
+def test_create_fleet():
+    """Test that discovered clients can be turned into a fleet."""
+    fleet = create_fleet([DiscoveredClient("10.0.0.1", 36330)], update_rate=30)
+    controller = fleet.controllers["10.0.0.1:36330"]
+    assert controller.update_rate == 30
+
+
+def test_main_prints_json(capsys):
+    """Test that the command line interface prints the clients as JSON."""
+    main(["127.0.0.1", "--port", "1", "--timeout", "0.1"])
+    assert json.loads(capsys.readouterr().out) == []
@@ -0,0 +1,101 @@
+"""Tests for export"""
+import csv
+import json
+import time
+
+import pytest
+
+from FoldingAtHomeControl import ExportFormat, ExportSink, FsyncPolicy
+
+SLOTS = [{"id": "00", "status": "RUNNING", "idle": False}]
+
+
+def read_jsonl(path):
+    """Read the records of a JSON Lines file."""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_jsonl_export_on_close(tmp_path):
+    """Test that pending records are written when the sink is closed."""
+    path = str(tmp_path / "export.jsonl")
+    sink = ExportSink(path, flush_interval=60)
+    sink.start()
+    sink.add_record("host1", "slots", SLOTS)
+    sink.add_record("host2", "slots", SLOTS)
+    sink.close()
+    records = read_jsonl(path)
+    assert [record["host"] for record in records] == ["host1", "host2"]
+    assert records[0]["type"] == "slots"
+    assert records[0]["message"] == SLOTS
+    assert sink.pending_count == 0
+
+
+def test_batch_size_triggers_flush(tmp_path):
+    """Test that a full batch is written without waiting for the interval."""
+    path = str(tmp_path / "export.jsonl")
+    sink = ExportSink(path, batch_size=2, flush_interval=60)
+    sink.start()
+    sink.add_record("host1", "slots", SLOTS)
+    sink.add_record("host1", "slots", SLOTS)
+    deadline = time.monotonic() + 5
+    while sink.pending_count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.pending_count == 0
+    sink.close()
+    assert len(read_jsonl(path)) == 2
+
+
+def test_csv_export(tmp_path):
+    """Test that CSV exports have a header and JSON encoded messages."""
+    path = str(tmp_path / "export.csv")
+    sink = ExportSink(path, ExportFormat.CSV, fsync_policy=FsyncPolicy.BATCH)
+    sink.start()
+    sink.add_record("host1", "slots", SLOTS)
+    sink.close()
+    sink.start()
+    sink.add_record("host2", "slots", SLOTS)
+    sink.close()
+    with open(path, encoding="utf-8", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["host"] for row in rows] == ["host1", "host2"]
+    assert json.loads(rows[0]["message"]) == SLOTS
+
+
+def test_rotation(tmp_path):
+    """Test that full files are rotated and old backups dropped."""
+    path = str(tmp_path / "export.jsonl")
+    sink = ExportSink(
+        path,
+        batch_size=1,
+        max_file_size=1,
+        backup_count=2,
+        fsync_policy=FsyncPolicy.ROTATE,
+    )
+    sink.start()
+    for index in range(4):
+        sink.add_record(f"host{index}", "slots", SLOTS)
+        deadline = time.monotonic() + 5
+        while sink.pending_count and time.monotonic() < deadline:
+            time.sleep(0.01)
+    sink.close()
+    assert read_jsonl(f"{path}.1")[0]["host"] == "host3"
+    assert read_jsonl(f"{path}.2")[0]["host"] == "host2"
+    assert not (tmp_path / "export.jsonl.3").exists()
+
+
+@pytest.mark.asyncio
+async def test_attach_filters_message_types(tmp_path, create_fake_client):
+    """Test that attached controllers only export the requested types."""
+    path = str(tmp_path / "export.jsonl")
+    sink = ExportSink(path)
+    client = create_fake_client()
+    await client.start_async()
+    remove_callback = sink.attach("host1", client.controller, message_types={"slots"})
+    await client.deliver_async("slots", SLOTS)
+    await client.deliver_async("units", [])
+    assert sink.pending_count == 1
+    remove_callback()
+    await client.deliver_async("slots", SLOTS)
+    assert sink.pending_count == 1
+    await client.close_async()
@@ -0,0 +1,355 @@
+"""Tests for fleet"""
+import asyncio
+import json
+import shlex
+from pathlib import Path
+
+import pytest
+
+from FoldingAtHomeControl import (
+    FoldingAtHomeControlAuthenticationRequired,
+    FoldingAtHomeController,
+    FoldingAtHomeControlNotConnected,
+    FoldingAtHomeFleet,
+    PowerLevel,
+)
+
+SLOTS = [
+    {"id": "00", "status": "RUNNING", "description": "cpu: 3"},
+    {"id": "01", "status": "RUNNING", "description": "gpu: 0:Hawaii"},
+]
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+
+
+DEFAULT_OPTIONS = {"idle": "false", "power": "MEDIUM", "team": "0", "user": "Anonymous"}
+DEFAULT_SLOT_OPTIONS = {"client-type": "normal", "cpus": "-1"}
+
+
+def list_options(options):
+    """List the options with non-default values like the client."""
+    return {
+        name: value
+        for name, value in options.items()
+        if DEFAULT_OPTIONS.get(name) != value
+    }
+
+
+def answer_options(options, line):
+    """Answer an options query or assignment like the client."""
+    arguments = shlex.split(line)[1:]
+    if arguments[0] == "-d":
+        return {name: options[name] for name in arguments[1:]}
+    assignments = dict(assignment.split("=", 1) for assignment in arguments)
+    if "power" in assignments:
+        assignments["power"] = assignments["power"].upper()
+    options.update(assignments)
+    return assignments
+
+
+def answer_slot_options(slot_options, line):
+    """Answer a slot-options query or assignment, which omits the slot id."""
+    _, slot_id, *arguments = line.split(" ", 2)
+    return answer_options(slot_options[slot_id], " ".join(["slot-options"] + arguments))
+
+
+async def start_client(
+    create_fake_client,
+    slots=None,
+    options=None,
+    respond=True,
+    send_options=True,
+    slot_options=None,
+):
+    """Start a fake client which answers commands like a client."""
+    slots = [dict(slot) for slot in slots or SLOTS]
+    slot_options = {
+        slot["id"]: {**DEFAULT_SLOT_OPTIONS, **(slot_options or {}).get(slot["id"], {})}
+        for slot in slots
+    }
+    options = {**DEFAULT_OPTIONS, **(options or {"power": "FULL"})}
+
+    def responder(line):
+        name, _, argument = line.partition(" ")
+        if name in ("pause", "unpause"):
+            for slot in slots:
+                if argument in ("", slot["id"]):
+                    slot["status"] = "PAUSED" if name == "pause" else "READY"
+        elif line.startswith("option power"):
+            options["power"] = argument.split(" ")[1].upper()
+        elif name == "options" and argument:
+            reply = answer_options(options, line)
+            return [("options", reply)] if respond else None
+        elif respond and name == "slot-options":
+            return [("slot-options", answer_slot_options(slot_options, line))]
+        elif respond and line == "slot-info":
+            return [("slots", slots)]
+        elif respond and line == "options":
+            return [("options", list_options(options))]
+        return None
+
+    client = create_fake_client(responder)
+    await client.start_async()
+    await client.deliver_async("slots", slots)
+    if send_options:
+        await client.deliver_async("options", list_options(options))
+    return client
+
+
+async def create_fleet(create_fake_client, hosts, **kwargs):
+    """Create a fleet of fake clients by name and group."""
+    fleet = FoldingAtHomeFleet(**kwargs)
+    clients = {}
+    for name, groups, client_kwargs in hosts:
+        clients[name] = await start_client(create_fake_client, **client_kwargs)
+        fleet.add_controller(name, clients[name].controller, groups=groups)
+    return fleet, clients
+
+
+@pytest.mark.asyncio
+async def test_pause_gpu_slots_in_group(create_fake_client):
+    """Test that only matching slots of the group are paused and acknowledged."""
+    fleet, clients = await create_fleet(
+        create_fake_client, [("gpu1", ["gpu"], {}), ("cpu1", (), {})]
+    )
+    results = await fleet.pause_slots_async(
+        group="gpu", slot_filter=lambda slot: slot["description"].startswith("gpu")
+    )
+    assert list(results) == ["gpu1"]
+    assert results["gpu1"].acknowledged
+    assert clients["gpu1"].sent_commands == ["pause 01\nslot-info"]
+    assert clients["cpu1"].sent_commands == []
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_failing_slot_filter_is_reported_per_host(create_fake_client):
+    """Test that a slot filter raising for one host does not abort the others."""
+    fleet, clients = await create_fleet(
+        create_fake_client,
+        [
+            ("gpu1", (), {}),
+            ("legacy", (), {"slots": [{"id": "00", "status": "RUNNING"}]}),
+        ],
+    )
+    results = await fleet.pause_slots_async(
+        slot_filter=lambda slot: slot["description"].startswith("gpu")
+    )
+    assert results["gpu1"].acknowledged
+    assert not results["legacy"].acknowledged
+    assert isinstance(results["legacy"].error, KeyError)
+    assert clients["legacy"].sent_commands == []
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_set_power_level_fleet_wide(create_fake_client):
+    """Test that the power level is set on all controllers."""
+    fleet, _ = await create_fleet(
+        create_fake_client,
+        [(f"host{index}", (), {}) for index in range(10)],
+        max_concurrency=2,
+    )
+    results = await fleet.set_power_level_async(PowerLevel.LIGHT)
+    assert len(results) == 10
+    assert all(result.acknowledged for result in results.values())
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_set_power_level_to_default(create_fake_client):
+    """Test that setting the default power level, which is not listed, succeeds."""
+    fleet, clients = await create_fleet(create_fake_client, [("host", (), {})])
+    results = await fleet.set_power_level_async(PowerLevel.MEDIUM, timeout=1)
+    assert results["host"].acknowledged
+    assert clients["host"].sent_commands == ["option power Medium\noptions -d power"]
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_options_sends_only_drift(create_fake_client):
+    """Test that only differing options are sent in a single command."""
+    fleet, clients = await create_fleet(
+        create_fake_client,
+        [
+            (name, (), {"options": {"user": user, "power": "full", "team": "0"}})
+            for name, user in (
+                ("synced", "Jane Doe"),
+                ("drifted", "anon"),
+                ("team", "Jane Doe"),
+            )
+        ],
+    )
+    results = await fleet.reconcile_options_async(
+        {"user": "Jane Doe", "power": "full"}, host_options={"team": {"team": 1}}
+    )
+    assert all(result.acknowledged for result in results.values())
+    assert clients["synced"].sent_commands == []
+    assert clients["drifted"].sent_commands == ['options user="Jane Doe"']
+    assert clients["team"].sent_commands == ["options -d team", "options team=1"]
+    assert clients["team"].controller.get_latest_message("options") == {
+        "user": "Jane Doe",
+        "power": "full",
+        "team": "1",
+    }
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_options_at_default_value(create_fake_client):
+    """Test that options at their default value are queried, not sent."""
+    fleet, clients = await create_fleet(create_fake_client, [("host", (), {})])
+    for _ in range(2):
+        results = await fleet.reconcile_options_async({"idle": False, "team": 0})
+        assert results["host"].acknowledged
+    assert clients["host"].sent_commands == ["options -d idle team"]
+    assert clients["host"].controller.get_latest_message("options") == {
+        "power": "FULL",
+        "idle": "false",
+        "team": "0",
+    }
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_options_without_cached_options(create_fake_client):
+    """Test that all desired options are queried when none were received yet."""
+    fleet, clients = await create_fleet(
+        create_fake_client, [("new", (), {"send_options": False})]
+    )
+    results = await fleet.reconcile_options_async({"power": "LIGHT", "idle": False})
+    assert results["new"].acknowledged
+    assert clients["new"].sent_commands == [
+        "options -d power idle",
+        "options power=LIGHT",
+    ]
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_slot_options(create_fake_client):
+    """Test that slot options are queried and set with one write per step."""
+    fleet, clients = await create_fleet(
+        create_fake_client, [("host", (), {"slot_options": {"00": {"cpus": "4"}}})]
+    )
+    for _ in range(2):
+        results = await fleet.reconcile_options_async(
+            {"team": 1}, slot_options={"cpus": 4, "client-type": "advanced"}
+        )
+        assert results["host"].acknowledged
+    assert clients["host"].sent_commands[:3] == [
+        "options -d team",
+        "slot-options 00 -d cpus client-type\nslot-options 01 -d cpus client-type",
+        "options team=1\n"
+        "slot-options 00 client-type=advanced\n"
+        "slot-options 01 cpus=4 client-type=advanced",
+    ]
+    assert clients["host"].sent_commands[3:] == [
+        "slot-options 00 -d cpus client-type\nslot-options 01 -d cpus client-type"
+    ]
+    results = await fleet.reconcile_options_async(
+        {},
+        slot_options={"cpus": 2},
+        slot_filter=lambda slot: slot["description"].startswith("gpu"),
+    )
+    assert results["host"].acknowledged
+    assert clients["host"].sent_commands[4:] == [
+        "slot-options 01 -d cpus",
+        "slot-options 01 cpus=2",
+    ]
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_options_in_client_format(create_fake_client):
+    """Test that enum-like options match the case the client reports them in."""
+    options = json.loads((FIXTURES / "options_response.json").read_text())
+    assert options["power"] == "FULL"
+    fleet, clients = await create_fleet(
+        create_fake_client,
+        [("synced", (), {"options": options}), ("light", (), {"options": options})],
+    )
+    results = await fleet.reconcile_options_async(
+        {"power": PowerLevel.FULL, "idle": True, "team": 1234567},
+        host_options={"light": {"power": "light"}},
+    )
+    assert all(result.acknowledged for result in results.values())
+    assert clients["synced"].sent_commands == []
+    assert clients["light"].sent_commands == ["options power=light"]
+    results = await fleet.set_power_level_async(PowerLevel.FULL)
+    assert all(result.acknowledged for result in results.values())
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_unacknowledged_command_times_out(create_fake_client):
+    """Test that a missing acknowledgement is reported per host."""
+    fleet, _ = await create_fleet(
+        create_fake_client,
+        [("silent", (), {"respond": False}), ("answering", (), {})],
+    )
+    results = await fleet.unpause_slots_async(timeout=0.1)
+    assert results["answering"].acknowledged
+    assert not results["silent"].acknowledged
+    assert isinstance(results["silent"].error, asyncio.TimeoutError)
+    await fleet.close_async()
+
+
+@pytest.mark.asyncio
+async def test_disconnected_controller_is_reported():
+    """Test that a disconnected controller fails without blocking the others."""
+    fleet = FoldingAtHomeFleet()
+    fleet.add_controller("disconnected", FoldingAtHomeController("localhost"))
+    results = await fleet.pause_slots_async(timeout=0.1)
+    assert isinstance(results["disconnected"].error, FoldingAtHomeControlNotConnected)
+
+
+@pytest.mark.asyncio
+async def test_close_fleet_within_deadline(create_fake_client):
+    """Test that hanging connections are aborted and start returns in time."""
+    fleet = FoldingAtHomeFleet()
+    clients = {name: create_fake_client() for name in ("clean", "hanging")}
+    for name, client in clients.items():
+        fleet.add_controller(name, client.controller)
+    subscribed = [
+        client.controller.expect_message("heartbeat", bool)
+        for client in clients.values()
+    ]
+    for client in clients.values():
+        client.send_message("heartbeat", 1)
+    start = asyncio.ensure_future(fleet.start())
+    await asyncio.wait_for(asyncio.gather(*subscribed), 5)
+    clients["hanging"].hanging = True
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    assert await fleet.close_async(timeout=0.1) == {"clean": True, "hanging": False}
+    assert await asyncio.wait_for(start, 1) == {}
+    assert loop.time() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_close_stops_reconnecting_controllers():
+    """Test that a controller retrying to connect stops and is not clean."""
+    fleet = FoldingAtHomeFleet()
+    fleet.add_controller("down", FoldingAtHomeController("127.0.0.1", port=1))
+    start = asyncio.ensure_future(fleet.start())
+    await asyncio.sleep(0.1)
+    assert await fleet.close_async(timeout=1) == {"down": False}
+    assert await asyncio.wait_for(start, 1) == {}
+
+
+@pytest.mark.asyncio
+async def test_start_reports_failing_controllers(create_fake_client):
+    """Test that one failing controller does not stop the fleet."""
+    fleet = FoldingAtHomeFleet()
+    misconfigured = create_fake_client(reconnect_enabled=False)
+    misconfigured.send(b"ERROR: unknown command or variable 'updates'\n")
+    fleet.add_controller("misconfigured", misconfigured.controller)
+    healthy = create_fake_client(reconnect_enabled=False)
+    healthy.close_connection()
+    fleet.add_controller("healthy", healthy.controller)
+    errors = await fleet.start()
+    assert list(errors) == ["misconfigured"]
+    assert isinstance(
+        errors["misconfigured"], FoldingAtHomeControlAuthenticationRequired
+    )
+    await fleet.close_async()
@@ -1,5 +1,6 @@
 """Tests for foldingathomecontrol"""
 import asyncio
+from asyncio import StreamReader
 
 try:
     from asyncio.streams import IncompleteReadError  # type: ignore
@@ -25,6 +26,7 @@ from FoldingAtHomeControl import (
     FoldingAtHomeControlAuthenticationFailed,
     FoldingAtHomeControlAuthenticationRequired,
     FoldingAtHomeControlConnectionFailed,
+    FoldingAtHomeController,
     FoldingAtHomeControlNotConnected,
 )
 
@@ -197,3 +199,231 @@ async def test_set_subscription_update_rate(foldingathomecontroller):
     assert foldingathomecontroller.update_rate == 5
     await foldingathomecontroller.set_subscription_update_rate_async(10)
     assert foldingathomecontroller.update_rate == 10
+
+
+@pytest.mark.asyncio
+async def test_liveness_timeout_follows_heartbeat_rate(
+    foldingathomecontroller, patched_open_connection
+):
+    """Test that slow heartbeat subscriptions extend the liveness timeout."""
+    assert foldingathomecontroller.liveness_timeout == 15
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await foldingathomecontroller.try_connect_async(timeout=5)
+        await foldingathomecontroller.set_subscription_update_rate_async(30)
+        await foldingathomecontroller.subscribe_async()
+        assert foldingathomecontroller.liveness_timeout == 60
+        await foldingathomecontroller.unsubscribe_all_async()
+        assert foldingathomecontroller.liveness_timeout == 15
+
+
+@pytest.mark.asyncio
+async def test_quiet_connection_is_probed(
+    disconnecting_foldingathomecontroller, patched_open_connection
+):
+    """Test that a quiet connection sends a heartbeat instead of disconnecting."""
+    disconnecting_foldingathomecontroller.set_read_timeout(0.1)
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await disconnecting_foldingathomecontroller.try_connect_async(timeout=5)
+        stream_reader, stream_writer = await asyncio.open_connection("localhost")
+        responses = iter([0.2, 0])
+
+        async def delayed_line(separator=b"\n"):
+            await asyncio.sleep(next(responses))
+            return b"PyON 1 heartbeat\n"
+
+        stream_reader.readuntil = delayed_line
+        assert (
+            await disconnecting_foldingathomecontroller._read_async()
+            == b"PyON 1 heartbeat\n"
+        )
+        stream_writer.write.assert_called_with(b"heartbeat\n")
+        assert disconnecting_foldingathomecontroller.is_connected
+
+
+@pytest.mark.asyncio
+async def test_unanswered_probe_disconnects(
+    disconnecting_foldingathomecontroller, patched_open_connection
+):
+    """Test that the connection is dropped when the heartbeat probe goes unanswered."""
+    disconnecting_foldingathomecontroller.set_read_timeout(0.1)
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await disconnecting_foldingathomecontroller.try_connect_async(timeout=5)
+        stream_reader, _ = await asyncio.open_connection("localhost")
+
+        async def silent(separator=b"\n"):
+            await asyncio.sleep(1)
+
+        stream_reader.readuntil = silent
+        with pytest.raises(FoldingAtHomeControlConnectionFailed):
+            await disconnecting_foldingathomecontroller._read_async()
+        assert not disconnecting_foldingathomecontroller.is_connected
+
+
+@pytest.mark.asyncio
+async def test_parse_multiline_pyon_message(
+    disconnecting_foldingathomecontroller, patched_open_connection
+):
+    """Test that a message spanning multiple lines is parsed in one piece."""
+    callback = MagicMock()
+    disconnecting_foldingathomecontroller.register_callback(callback)
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await disconnecting_foldingathomecontroller.try_connect_async(timeout=5)
+        stream_reader, _ = await asyncio.open_connection("localhost")
+        stream_reader.readuntil.side_effect = [
+            b"PyON 1 slots\n",
+            b'[\n  {\n    "id": "00",\n    "idle": False\n  }\n]\n---\n',
+        ]
+        await disconnecting_foldingathomecontroller._try_parse_pyon_message_async()
+    callback.assert_called_with("slots", [{"id": "00", "idle": False}])
+
+
+@pytest.mark.asyncio
+async def test_stream_large_message_to_element_callback():
+    """Test that messages larger than the buffer are streamed element by element."""
+    controller = FoldingAtHomeController("localhost", buffer_limit=64)
+    elements = []
+    ends = []
+    controller.register_element_callback(
+        "units",
+        lambda _, element: elements.append(element),
+        lambda *end: ends.append(end),
+    )
+    callback = MagicMock()
+    controller.register_callback(callback)
+    stream_reader = StreamReader(limit=64)
+    stream_reader.feed_data(b"Welcome\nPyON 1 units\n[\n")
+    for unit in range(20):
+        stream_reader.feed_data(b'  {"id": "%02d", "percentdone": "0.00%%"},\n' % unit)
+    stream_reader.feed_data(b"]\n---\n")
+    with patch("asyncio.open_connection", return_value=(stream_reader, MagicMock())):
+        await controller.try_connect_async(timeout=5)
+        await controller._try_parse_pyon_message_async()
+    assert [element["id"] for element in elements] == [f"{i:02d}" for i in range(20)]
+    assert ends == [("units", True)]
+    callback.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_oversized_message_is_discarded():
+    """Test that messages exceeding the size limit are skipped."""
+    controller = FoldingAtHomeController(
+        "localhost", buffer_limit=64, max_message_size=128
+    )
+    callback = MagicMock()
+    controller.register_callback(callback)
+    stream_reader = StreamReader(limit=64)
+    stream_reader.feed_data(
+        b"Welcome\nPyON 1 units\n[" + b'"x",' * 100 + b'"x"]\n---\n'
+    )
+    stream_reader.feed_data(b"PyON 1 heartbeat\n1\n---\n")
+    with patch("asyncio.open_connection", return_value=(stream_reader, MagicMock())):
+        await controller.try_connect_async(timeout=5)
+        await controller._try_parse_pyon_message_async()
+        callback.assert_not_called()
+        await controller._try_parse_pyon_message_async()
+    callback.assert_called_once_with("heartbeat", 1)
+
+
+@pytest.mark.asyncio
+async def test_oversized_streamed_message_is_dropped():
+    """Test that streamed messages exceeding the size limit are dropped."""
+    controller = FoldingAtHomeController(
+        "localhost", buffer_limit=64, max_message_size=512
+    )
+    elements = []
+    ends = []
+    controller.register_element_callback(
+        "trajectory",
+        lambda _, element: elements.append(element),
+        lambda *end: ends.append(end),
+    )
+    callback = MagicMock()
+    controller.register_callback(callback)
+    stream_reader = StreamReader(limit=64)
+    stream_reader.feed_data(b'Welcome\nPyON 1 trajectory\n{"atoms": [')
+    stream_reader.feed_data(b'"x", ' * 1000 + b'"x"], "bonds": []}\n---\n')
+    stream_reader.feed_data(b"PyON 1 heartbeat\n1\n---\n")
+    with patch("asyncio.open_connection", return_value=(stream_reader, MagicMock())):
+        await controller.try_connect_async(timeout=5)
+        await controller._try_parse_pyon_message_async()
+        await controller._try_parse_pyon_message_async()
+    assert elements == []
+    assert ends == [("trajectory", False)]
+    callback.assert_called_once_with("heartbeat", 1)
+
+
+@pytest.mark.asyncio
+async def test_streamed_message_cut_off_by_disconnect_is_incomplete():
+    """Test that the end callback learns about a message lost mid-stream."""
+    controller = FoldingAtHomeController("localhost", buffer_limit=64)
+    elements = []
+    ends = []
+    controller.register_element_callback(
+        "units",
+        lambda _, element: elements.append(element),
+        lambda *end: ends.append(end),
+    )
+    stream_reader = StreamReader(limit=64)
+    stream_reader.feed_data(b"Welcome\nPyON 1 units\n[\n")
+    for unit in range(20):
+        stream_reader.feed_data(b'  {"id": "%02d"},\n' % unit)
+    stream_reader.feed_eof()
+    with patch("asyncio.open_connection", return_value=(stream_reader, MagicMock())):
+        await controller.try_connect_async(timeout=5)
+        with pytest.raises(IncompleteReadError):
+            await controller._try_parse_pyon_message_async()
+    assert elements
+    assert ends == [("units", False)]
+
+
+@pytest.mark.asyncio
+async def test_set_command_update_rate(
+    foldingathomecontroller, patched_open_connection
+):
+    """Test that a single subscription is replaced under its id."""
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await foldingathomecontroller.try_connect_async(timeout=5)
+        await foldingathomecontroller.subscribe_async(["heartbeat", "options"])
+        with patch.object(
+            foldingathomecontroller._serialconnection, "send_async"
+        ) as send_async:
+            await foldingathomecontroller.set_command_update_rate_async("options", 60)
+        send_async.assert_called_once_with("updates add 1 60 $options\n")
+        assert foldingathomecontroller.subscriptions == {"heartbeat": 5, "options": 60}
+        await foldingathomecontroller.unsubscribe_all_async()
+        assert foldingathomecontroller.subscriptions == {}
+
+
+@pytest.mark.asyncio
+async def test_start_returns_after_close(create_fake_client):
+    """Test that a deliberate close ends start without a CancelledError."""
+    client = create_fake_client()
+    received = client.controller.expect_message("heartbeat", bool)
+    client.send_message("heartbeat", 1)
+    task = asyncio.ensure_future(client.controller.start())
+    await asyncio.wait_for(received, 5)
+    assert await client.controller.close_async(timeout=1)
+    assert await asyncio.wait_for(task, 1) is None
+    assert not task.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_option_replies_are_merged_into_options(create_fake_client):
+    """Test that replies listing some options do not truncate the options."""
+    client = create_fake_client(
+        lambda line: [("options", {"user": "Jane"})]
+        if line.startswith("options ")
+        else None
+    )
+    await client.start_async()
+    await client.deliver_async("options", {"user": "anon", "team": "1"})
+    received = client.controller.expect_message("options", bool)
+    await client.controller.send_command_async("options user=Jane")
+    assert await asyncio.wait_for(received, 5) == {"user": "Jane", "team": "1"}
+    assert client.controller.get_latest_message("options") == {
+        "user": "Jane",
+        "team": "1",
+    }
+    await client.deliver_async("options", {"user": "Jane"})
+    assert client.controller.get_latest_message("options") == {"user": "Jane"}
+    await client.close_async()
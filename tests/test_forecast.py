@@ -0,0 +1,95 @@
+"""Tests for forecast"""
+import math
+
+import pytest
+
+from FoldingAtHomeControl import FleetForecast
+from FoldingAtHomeControl.forecast import parse_interval, parse_number
+
+
+def create_unit(unit_id, percent_done, eta="1 hours", timeremaining="2 days"):
+    """Create a unit like the ones in a queue-info message."""
+    return {
+        "unit": unit_id,
+        "percentdone": f"{percent_done}%",
+        "eta": eta,
+        "timeremaining": timeremaining,
+        "ppd": "2400",
+        "creditestimate": "1000",
+    }
+
+
+def test_parse_interval():
+    """Test parsing the intervals used by the client."""
+    assert parse_interval("1 hours 04 mins") == 3840
+    assert parse_interval("2.50 days") == 216000
+    assert parse_interval("30 secs") == 30
+    assert math.isnan(parse_interval("unknown"))
+    assert math.isnan(parse_number("unknown"))
+
+
+def test_forecast_uses_eta_until_progress_is_observed():
+    """Test that the client's eta is used before a rate is known."""
+    forecast = FleetForecast()
+    forecast.update_units("host1", [create_unit("0x1", 50)], received_at=1000)
+    result = forecast.forecast()
+    assert result.keys == [("host1", "0x1")]
+    assert result.completion_times == [4600]
+    assert result.at_risk == [False]
+    assert result.credit_per_hour == [100]
+    assert result.credit_estimates == [1000]
+    assert result.total_credit_per_hour == 100
+
+
+def test_forecast_uses_observed_rate():
+    """Test that the observed progress rate drives the completion time."""
+    forecast = FleetForecast()
+    forecast.update_units("host1", [create_unit("0x1", 10)], received_at=0)
+    forecast.update_units("host1", [create_unit("0x1", 10)], received_at=50)
+    forecast.update_units("host1", [create_unit("0x1", 20)], received_at=100)
+    assert forecast.forecast().completion_times == [900]
+
+
+def test_forecast_flags_units_at_risk():
+    """Test that units finishing after their deadline are at risk."""
+    forecast = FleetForecast(deadline_margin=600)
+    forecast.update_units(
+        "host1",
+        [
+            create_unit("0x1", 0, eta="3 hours", timeremaining="2 hours"),
+            create_unit("0x2", 0, eta="1 hours", timeremaining="1 hours 05 mins"),
+            create_unit("0x3", 0, eta="1 hours", timeremaining="2 hours"),
+        ],
+        received_at=0,
+    )
+    assert forecast.forecast().at_risk == [True, True, False]
+
+
+def test_removed_units_free_their_rows():
+    """Test that units missing from a message are removed and rows reused."""
+    forecast = FleetForecast()
+    forecast.update_units("host1", [create_unit("0x1", 1), create_unit("0x2", 2)])
+    forecast.update_units("host2", [create_unit("0x1", 3)])
+    forecast.update_units("host1", [create_unit("0x3", 4)])
+    assert len(forecast) == 2
+    assert sorted(forecast.forecast().keys) == [("host1", "0x3"), ("host2", "0x1")]
+    assert len(forecast._keys) == 3
+
+    forecast.remove_host("host2")
+    assert forecast.forecast().keys == [("host1", "0x3")]
+
+
+@pytest.mark.asyncio
+async def test_attach_to_controller(create_fake_client):
+    """Test that unit messages of a controller update the forecast."""
+    forecast = FleetForecast()
+    client = create_fake_client()
+    await client.start_async()
+    remove_callback = forecast.attach("host1", client.controller)
+    await client.deliver_async("units", [create_unit("0x1", 1)])
+    await client.deliver_async("slots", [])
+    assert len(forecast) == 1
+    remove_callback()
+    await client.deliver_async("units", [create_unit("0x1", 1), create_unit("0x2", 2)])
+    assert len(forecast) == 1
+    await client.close_async()
@@ -0,0 +1,124 @@
+"""Tests for proxy"""
+import asyncio
+
+import pytest
+
+from FoldingAtHomeControl import FoldingAtHomeController, FoldingAtHomeProxy
+from FoldingAtHomeControl.proxy import WELCOME_MESSAGE
+
+OPTIONS = {"power": "FULL", "idle": False}
+
+
+async def start_upstream(create_fake_client, responder=None):
+    """Start an upstream client which already sent its options."""
+    upstream = create_fake_client(responder)
+    await upstream.start_async()
+    await upstream.deliver_async("options", OPTIONS)
+    return upstream
+
+
+async def read_message(reader):
+    """Read a whole PyON message."""
+    return await asyncio.wait_for(reader.readuntil(b"\n---\n"), 1)
+
+
+@pytest.mark.asyncio
+async def test_query_is_answered_from_cache(create_fake_client):
+    """Test that queries are answered without asking the upstream client."""
+    upstream = await start_upstream(create_fake_client)
+    proxy = FoldingAtHomeProxy(upstream.controller, port=0)
+    await proxy.start_async()
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy.port)
+    assert await reader.readuntil(b"\n") == WELCOME_MESSAGE
+    writer.write(b"options\n")
+    message = await read_message(reader)
+    assert message.startswith(b"PyON 1 options\n")
+    assert b'"idle": False' in message
+    assert upstream.sent_commands == []
+    writer.close()
+    await proxy.close_async()
+    await upstream.close_async()
+
+
+@pytest.mark.asyncio
+async def test_commands_are_forwarded(create_fake_client):
+    """Test that other commands are sent to the upstream client."""
+    upstream = await start_upstream(create_fake_client)
+    proxy = FoldingAtHomeProxy(upstream.controller, port=0)
+    await proxy.start_async()
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy.port)
+    await reader.readuntil(b"\n")
+    writer.write(b"pause 01\n")
+    await writer.drain()
+    for _ in range(100):
+        if upstream.sent_commands:
+            break
+        await asyncio.sleep(0.01)
+    assert upstream.sent_commands == ["pause 01"]
+    writer.close()
+    await proxy.close_async()
+    await upstream.close_async()
+
+
+@pytest.mark.asyncio
+async def test_downstream_controller_receives_updates(create_fake_client):
+    """Test that a downstream controller gets cached and fanned out messages."""
+    upstream = await start_upstream(create_fake_client)
+    proxy = FoldingAtHomeProxy(upstream.controller, port=0)
+    await proxy.start_async()
+    downstream = FoldingAtHomeController(
+        "127.0.0.1", proxy.port, reconnect_enabled=False
+    )
+    received = []
+    downstream.register_callback(lambda *message: received.append(message))
+    await downstream.try_connect_async(timeout=1)
+    task = asyncio.ensure_future(downstream.start(connect=False))
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+    await upstream.deliver_async("slots", [{"id": "00"}])
+    for _ in range(100):
+        if len(received) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert received == [("options", OPTIONS), ("slots", [{"id": "00"}])]
+    task.cancel()
+    await downstream.close_async(timeout=1)
+    await proxy.close_async()
+    await upstream.close_async()
+
+
+@pytest.mark.asyncio
+async def test_forwarded_query_is_answered(create_fake_client):
+    """Test that the answer to a forwarded query reaches the asking client."""
+    upstream = await start_upstream(
+        create_fake_client, lambda line: [("ppd", 123456)] if line == "ppd" else None
+    )
+    proxy = FoldingAtHomeProxy(upstream.controller, port=0)
+    await proxy.start_async()
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy.port)
+    await reader.readuntil(b"\n")
+    writer.write(b"ppd\n")
+    assert await read_message(reader) == b"PyON 1 ppd\n123456\n---\n"
+    assert upstream.sent_commands == ["ppd"]
+    writer.close()
+    await proxy.close_async()
+    await upstream.close_async()
+
+
+@pytest.mark.asyncio
+async def test_unsupported_commands_are_rejected(create_fake_client):
+    """Test that unknown and undecodable commands get an error line."""
+    upstream = await start_upstream(create_fake_client)
+    proxy = FoldingAtHomeProxy(upstream.controller, port=0)
+    await proxy.start_async()
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy.port)
+    await reader.readuntil(b"\n")
+    writer.write(b"unknown\n\xff\xfe\n")
+    assert await reader.readuntil(b"\n") == b"ERROR: unsupported command 'unknown'\n"
+    assert (await reader.readuntil(b"\n")).startswith(b"ERROR: unsupported command")
+    assert upstream.sent_commands == []
+    writer.close()
+    await proxy.close_async()
+    await upstream.close_async()
@@ -0,0 +1,86 @@
+"""Tests for pyonparser"""
+import json
+
+import pytest
+
+from FoldingAtHomeControl.pyonparser import PyOnStreamDecoder, convert_pyon_to_json
+
+SLOTS = b'[\n  {\n    "id": "00",\n    "idle": False\n  },\n  {\n    "id": "01",\n    "idle": True\n  }\n]'  # pylint: disable=line-too-long # noqa: line-too-long
+
+
+def test_convert_pyon_bytes():
+    """Test that bytes and memoryviews are converted."""
+    expected = [{"id": "00", "idle": False}, {"id": "01", "idle": True}]
+    assert convert_pyon_to_json(SLOTS) == expected
+    assert convert_pyon_to_json(memoryview(SLOTS)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, len(SLOTS)])
+def test_stream_decoder_list(chunk_size):
+    """Test that list elements are returned as soon as they are complete."""
+    decoder = PyOnStreamDecoder()
+    elements = []
+    for start in range(0, len(SLOTS), chunk_size):
+        chunk = SLOTS[start : start + chunk_size]
+        elements.extend(decoder.feed(chunk, start + chunk_size >= len(SLOTS)))
+    assert elements == [{"id": "00", "idle": False}, {"id": "01", "idle": True}]
+
+
+def test_stream_decoder_returns_first_element_early():
+    """Test that an element is returned before the message is complete."""
+    decoder = PyOnStreamDecoder()
+    assert decoder.feed(SLOTS[:60]) == [{"id": "00", "idle": False}]
+
+
+def test_stream_decoder_dict():
+    """Test that dict members are returned as key value pairs."""
+    decoder = PyOnStreamDecoder()
+    elements = decoder.feed(b'{\n  "atoms": [1, 2],\n  "bonds": []\n}\n')
+    elements += decoder.feed(b"", True)
+    assert elements == [("atoms", [1, 2]), ("bonds", [])]
+
+
+def test_stream_decoder_scalar():
+    """Test that a scalar message is returned once it is complete."""
+    decoder = PyOnStreamDecoder()
+    assert decoder.feed(b"12") == []
+    assert decoder.feed(b"3", True) == [123]
+
+
+def test_stream_decoder_raises_on_incomplete_message():
+    """Test that a truncated message raises."""
+    decoder = PyOnStreamDecoder()
+    with pytest.raises(json.JSONDecodeError):
+        decoder.feed(SLOTS[:40], True)
+
+
+def test_stream_decoder_large_dict_member():
+    """Test that a large member split into many chunks is decoded once."""
+    atoms = [
+        {"symbol": "C", "charge": index, "name": 'a "[{,'} for index in range(5000)
+    ]
+    payload = json.dumps({"atoms": atoms, "bonds": [[0, 1]]}, indent=2).encode()
+    decoder = PyOnStreamDecoder()
+    elements = []
+    for start in range(0, len(payload), 4096):
+        elements.extend(decoder.feed(payload[start : start + 4096]))
+    elements.extend(decoder.feed(b"", True))
+    assert elements == [("atoms", atoms), ("bonds", [[0, 1]])]
+
+
+def test_stream_decoder_split_strings_and_characters():
+    """Test that escapes and utf-8 sequences split between chunks are kept."""
+    payload = '["\\\\", "\\"]", "ü€"]'.encode()
+    decoder = PyOnStreamDecoder()
+    elements = []
+    for index in range(len(payload)):
+        elements.extend(decoder.feed(payload[index : index + 1]))
+    assert elements == ["\\", '"]', "ü€"]
+
+
+def test_stream_decoder_limits_element_size():
+    """Test that elements larger than the limit raise."""
+    decoder = PyOnStreamDecoder(max_element_size=100)
+    assert decoder.feed(b'["small",') == ["small"]
+    with pytest.raises(ValueError):
+        decoder.feed(b'"' + b"x" * 200)
@@ -0,0 +1,78 @@
+"""Tests for runner"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from FoldingAtHomeControl import BackgroundRunner, FoldingAtHomeFleet
+
+SLOTS = [{"id": "00", "status": "RUNNING"}]
+
+
+def create_fleet(create_fake_client):
+    """Create a fleet whose client sends slots once connected."""
+    client = create_fake_client()
+    client.send_message("slots", SLOTS)
+    fleet = FoldingAtHomeFleet()
+    fleet.add_controller("host1", client.controller)
+    return fleet, client
+
+
+def wait_for_message(runner, name, message_type):
+    """Poll the runner until a message arrived."""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        message = runner.get_latest_message(name, message_type)
+        if message is not None:
+            return message
+        time.sleep(0.01)
+    return None
+
+
+def test_runner_publishes_messages(create_fake_client):
+    """Test that messages received on the loop thread are readable."""
+    fleet, client = create_fleet(create_fake_client)
+    with BackgroundRunner(fleet) as runner:
+        assert runner.is_running
+        assert wait_for_message(runner, "host1", "slots") == SLOTS
+        received_at = client.controller.get_message_received_at("slots")
+        assert runner.get_message_received_at("host1", "slots") == received_at
+        assert runner.snapshot()["host1"]["slots"] == (received_at, SLOTS)
+        assert runner.get_latest_message("host2", "slots") is None
+    assert not runner.is_running
+    assert not client.controller.is_connected
+
+    async def deliver_after_stop():
+        await client.start_async()
+        await client.deliver_async("slots", [])
+        await client.close_async()
+
+    asyncio.run(deliver_after_stop())
+    assert runner.get_latest_message("host1", "slots") == SLOTS
+
+
+def test_runner_runs_commands_on_loop_thread(create_fake_client):
+    """Test that submitted coroutines run on the runner thread."""
+
+    async def get_thread():
+        return threading.current_thread()
+
+    async def fail():
+        raise ValueError("failed")
+
+    fleet, _ = create_fleet(create_fake_client)
+    with BackgroundRunner(fleet) as runner:
+        assert runner.run(get_thread(), timeout=5) is not threading.current_thread()
+        with pytest.raises(ValueError):
+            runner.submit(fail()).result(5)
+
+
+def test_runner_requires_start():
+    """Test that commands can not be submitted before the runner started."""
+    runner = BackgroundRunner(FoldingAtHomeFleet())
+    coroutine = asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        runner.submit(coroutine)
+    coroutine.close()
+    runner.stop()
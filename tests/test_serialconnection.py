@@ -1,6 +1,7 @@
 """Tests for serialconnection"""
 import asyncio
-from unittest.mock import patch
+import threading
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -30,3 +31,50 @@ def test_set_read_timeout(serialconnection):
     assert serialconnection.read_timeout == 1
     serialconnection.set_read_timeout(5)
     assert serialconnection.read_timeout == 5
+
+
+@pytest.mark.asyncio
+async def test_cleanup_aborts_unresponsive_writer(
+    serialconnection, patched_open_connection
+):
+    """Test that a writer which does not close in time is aborted."""
+    with patch("asyncio.open_connection", return_value=patched_open_connection):
+        await serialconnection.connect_async()
+        _, stream_writer = await asyncio.open_connection("localhost")
+        stream_writer.wait_closed = wait_two_seconds
+        stream_writer.transport = MagicMock()
+        assert not await serialconnection.cleanup_async(timeout=0.1)
+        stream_writer.transport.abort.assert_called_once()
+        assert not serialconnection.is_connected
+
+
+def test_locks_bind_to_the_loop_using_them(serialconnection):
+    """Test that a connection created on one thread can be used on another."""
+    writer = MagicMock()
+    sent = []
+
+    async def drain():
+        await asyncio.sleep(0.01)
+
+    async def send_concurrently():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"Welcome\n")
+        writer.write = sent.append
+        writer.drain = drain
+        with patch("asyncio.open_connection", return_value=(reader, writer)):
+            await serialconnection.connect_async()
+        await asyncio.gather(*(serialconnection.send_async("info\n") for _ in range(3)))
+
+    errors = []
+
+    def run():
+        try:
+            asyncio.run(send_concurrently())
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    assert not errors
+    assert sent == [b"info\n"] * 3
@@ -0,0 +1,90 @@
+"""Tests for snapshot"""
+import asyncio
+import gzip
+from unittest.mock import patch
+
+import pytest
+
+from FoldingAtHomeControl import (
+    FoldingAtHomeController,
+    load_snapshot,
+    persist_snapshots_async,
+    save_snapshot,
+)
+
+SLOTS = [{"id": "00", "status": "RUNNING"}]
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test that restored messages are available and marked as stale."""
+    path = str(tmp_path / "snapshot.json.gz")
+    controller = FoldingAtHomeController("localhost")
+    controller.restore_snapshot({"slots": (1234.5, SLOTS)})
+    save_snapshot(path, {"host1": controller})
+
+    restarted = FoldingAtHomeController("localhost")
+    assert load_snapshot(path, {"host1": restarted, "host2": restarted}) == ["host1"]
+    assert restarted.get_latest_message("slots") == SLOTS
+    assert restarted.get_message_received_at("slots") == 1234.5
+    assert restarted.is_message_stale("slots")
+
+
+def test_missing_snapshot_restores_nothing(tmp_path):
+    """Test that a missing snapshot file is not an error."""
+    controller = FoldingAtHomeController("localhost")
+    assert load_snapshot(str(tmp_path / "missing"), {"host1": controller}) == []
+    assert controller.get_latest_message("slots") is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"not gzip",
+        gzip.compress(b'{"version": 1, "controllers": {"host1": {"slots": '),
+        gzip.compress(b'{"version": 0, "controllers": {}}'),
+        gzip.compress(b'{"version": 1, "controllers": {"host1": []}}'),
+        gzip.compress(b"[]"),
+    ],
+)
+def test_unreadable_snapshot_restores_nothing(tmp_path, content):
+    """Test that corrupt, truncated or outdated snapshots start cold."""
+    path = tmp_path / "snapshot.json.gz"
+    path.write_bytes(content)
+    controller = FoldingAtHomeController("localhost")
+    assert load_snapshot(str(path), {"host1": controller}) == []
+    assert controller.get_latest_message("slots") is None
+
+
+@pytest.mark.asyncio
+async def test_live_message_replaces_stale_message(
+    disconnecting_foldingathomecontroller, patched_pyon_options_prepared_open_connection
+):
+    """Test that a live message clears the stale mark."""
+    controller = disconnecting_foldingathomecontroller
+    controller.restore_snapshot({"options": (0, {"power": "LIGHT"})})
+    assert controller.is_message_stale("options")
+    with patch(
+        "asyncio.open_connection",
+        return_value=patched_pyon_options_prepared_open_connection,
+    ):
+        await controller.start()
+    assert not controller.is_message_stale("options")
+    assert controller.get_latest_message("options")["power"] == "FULL"
+
+
+@pytest.mark.asyncio
+async def test_persist_snapshots(tmp_path):
+    """Test that snapshots are written periodically."""
+    path = str(tmp_path / "snapshot.json.gz")
+    controller = FoldingAtHomeController("localhost")
+    controller.restore_snapshot({"slots": (1.0, SLOTS)})
+    task = asyncio.ensure_future(
+        persist_snapshots_async(path, {"host1": controller}, interval=0.01)
+    )
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    restarted = FoldingAtHomeController("localhost")
+    assert load_snapshot(path, {"host1": restarted}) == ["host1"]
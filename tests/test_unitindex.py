@@ -0,0 +1,79 @@
+"""Tests for unitindex"""
+import pytest
+
+from FoldingAtHomeControl import UnitIndex
+
+
+def create_unit(queue_id, unit_id, project=11777, state="RUNNING", core="0xa8"):
+    """Create a unit like the ones in a queue-info message."""
+    return {
+        "id": queue_id,
+        "unit": unit_id,
+        "project": project,
+        "run": 0,
+        "clone": 1,
+        "gen": 2,
+        "state": state,
+        "core": core,
+    }
+
+
+def test_lookups():
+    """Test looking units up by each index."""
+    index = UnitIndex()
+    index.update_units("host1", [create_unit("00", "0xD4EA"), create_unit("01", "0x1")])
+    index.update_units("host2", [create_unit("00", "0x2", project=16435, core="0x22")])
+    assert len(index) == 3
+    assert index.get_unit("0xd4ea").host == "host1"
+    assert index.get_unit("0x3") is None
+    assert len(index.find_by_project_run_clone_gen(11777, 0, 1, 2)) == 2
+    assert index.get_hosts_by_project(11777) == {"host1"}
+    assert [unit.unit_id for unit in index.find_by_core("0x22")] == ["0x2"]
+    assert len(index.find_by_state("running")) == 3
+
+
+def test_changed_and_removed_units_move():
+    """Test that changed units move between indexes and removed ones vanish."""
+    index = UnitIndex()
+    index.update_units("host1", [create_unit("00", "0x1"), create_unit("01", "0x2")])
+    index.update_units("host1", [create_unit("00", "0x1", state="SEND")])
+    assert index.find_by_state("RUNNING") == []
+    assert [unit.unit_id for unit in index.find_by_state("SEND")] == ["0x1"]
+    assert index.get_unit("0x2") is None
+    assert "RUNNING" not in index._by_state
+
+    index.update_units("host1", [create_unit("00", "0x3", project=18201)])
+    assert index.get_unit("0x1") is None
+    assert index.get_hosts_by_project(11777) == set()
+    assert index.get_hosts_by_project(18201) == {"host1"}
+
+    index.remove_host("host1")
+    assert len(index) == 0
+    assert not index._by_project
+
+
+def test_state_duration():
+    """Test finding units stuck in a state."""
+    index = UnitIndex()
+    index.update_units("host1", [create_unit("00", "0x1", state="DOWNLOAD")], 0)
+    index.update_units("host2", [create_unit("00", "0x2", state="RUNNING")], 0)
+    index.update_units("host2", [create_unit("00", "0x2", state="DOWNLOAD")], 3000)
+    index.update_units("host1", [create_unit("00", "0x1", state="DOWNLOAD")], 3000)
+    stuck = index.find_by_state("DOWNLOAD", min_duration=3600, now=3700)
+    assert [unit.host for unit in stuck] == ["host1"]
+
+
+@pytest.mark.asyncio
+async def test_attach_to_controller(create_fake_client):
+    """Test that unit messages of a controller update the index."""
+    index = UnitIndex()
+    client = create_fake_client()
+    await client.start_async()
+    remove_callback = index.attach("host1", client.controller)
+    await client.deliver_async("units", [create_unit("00", "0x1")])
+    await client.deliver_async("slots", [])
+    assert index.get_unit("0x1").key == ("host1", "00")
+    remove_callback()
+    await client.deliver_async("units", [create_unit("00", "0x2")])
+    assert index.get_unit("0x2") is None
+    await client.close_async()